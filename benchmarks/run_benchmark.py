@@ -0,0 +1,168 @@
+"""Offline throughput benchmark for AudioProcessor.batch_process_deck.
+
+Runs the real processor against local VOICEVOX and AnkiConnect stubs with a
+synthetic deck, one case per (mode, deck size), each in a fresh subprocess so
+peak RSS is measured per case. The stubs run in a process of their own, so
+they neither share the processor's GIL nor count toward its memory; the
+encoder pool's peak RSS and CPU time are reported separately. Results are
+printed (or written) as JSON.
+
+    python -m benchmarks.run_benchmark --notes 1000 10000 --modes serial concurrent
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_servers import StubConfig, StubVoiceVox, StubAnkiConnect, StubProcess, synthetic_deck
+from modules.audio_processor import AudioProcessor
+
+# Processor settings for each mode; concurrent modes take --workers from the command line
+MODES = {
+    "serial": {"workers": 1},
+    "concurrent": {"synth_batch_size": 1},
+    "batched": {"synth_batch_size": 8},
+}
+
+
+def usage(children: bool = False):
+    """getrusage for this process, or for its finished child processes (None on Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+
+
+def rss_mb(maxrss: Optional[int]) -> Optional[float]:
+    if maxrss is None:
+        return None
+    # Linux reports kilobytes, macOS bytes
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def make_stubs(case: Dict):
+    notes = synthetic_deck(case["notes"], duplicate_ratio=case["duplicate_ratio"], seed=case["seed"])
+    voicevox = StubVoiceVox(StubConfig(case["vv_latency_ms"], error_rate=case["vv_error_rate"],
+                                       concurrency=case["vv_concurrency"], seed=case["seed"]),
+                            audio_seconds=case["audio_seconds"], ms_per_char=case["vv_ms_per_char"])
+    anki = StubAnkiConnect(StubConfig(case["anki_latency_ms"], error_rate=case["anki_error_rate"],
+                                      seed=case["seed"]), notes)
+    return voicevox, anki
+
+
+def run_case(case: Dict) -> Dict:
+    servers = StubProcess(make_stubs, case).start()
+
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.WARNING)
+    settings = dict(MODES[case["mode"]])
+    settings.setdefault("workers", case["workers"])
+    work_dir = tempfile.mkdtemp(prefix="voicevox_anki_bench_")
+    processor = AudioProcessor(logger, cache_dir=os.path.join(work_dir, "cache"),
+                               journal_path=os.path.join(work_dir, "journal.sqlite3"),
+                               voicevox_urls=[servers.voicevox_url], anki_url=servers.anki_url, **settings)
+    start = time.monotonic()
+    try:
+        asyncio.run(processor.run("Benchmark"))
+        elapsed = time.monotonic() - start
+        # The encoder pool has exited by now while the stubs still run, so
+        # RUSAGE_CHILDREN covers just the encoder processes (and their ffmpeg)
+        encoders = usage(children=True)
+    finally:
+        stubs = servers.stop()
+    own = usage()
+
+    metrics = processor.metrics.summary()
+    linked = sum(1 for note in stubs["notes"].values() if note["fields"]["Sentence Audio"]["value"])
+    return {
+        "mode": case["mode"],
+        "notes": case["notes"],
+        "workers": settings["workers"],
+        "elapsed_s": round(elapsed, 3),
+        "notes_per_sec": round(case["notes"] / elapsed, 2) if elapsed > 0 else None,
+        "notes_linked": linked,
+        "peak_rss_mb": rss_mb(own.ru_maxrss) if own else None,
+        "cpu_s": round(own.ru_utime + own.ru_stime, 2) if own else None,
+        "encoder_peak_rss_mb": rss_mb(encoders.ru_maxrss) if encoders else None,
+        "encoder_cpu_s": round(encoders.ru_utime + encoders.ru_stime, 2) if encoders else None,
+        "stub_peak_rss_mb": rss_mb(stubs["peak_rss"]),
+        "stages": {name: {key: stage[key] for key in ("count", "errors", "p50_ms", "p99_ms", "max_in_flight")}
+                   for name, stage in metrics["stages"].items()},
+        "counters": metrics["counters"],
+        "voicevox_requests": stubs["voicevox_requests"],
+        "anki_requests": stubs["anki_requests"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark deck processing against stub servers")
+    parser.add_argument("--notes", type=int, nargs="+", default=[1000], help="Deck sizes to run (e.g. 1000 100000)")
+    parser.add_argument("--modes", nargs="+", default=["serial", "concurrent"], choices=sorted(MODES))
+    parser.add_argument("--workers", type=int, default=8, help="Workers per stage for concurrent modes")
+    parser.add_argument("--vv-latency-ms", type=float, default=20.0, help="Base VOICEVOX request latency")
+    parser.add_argument("--vv-ms-per-char", type=float, default=1.0, help="Extra synthesis latency per character")
+    parser.add_argument("--vv-concurrency", type=int, default=4, help="Requests the VOICEVOX stub serves at once")
+    parser.add_argument("--vv-error-rate", type=float, default=0.0, help="Fraction of VOICEVOX requests that fail")
+    parser.add_argument("--anki-latency-ms", type=float, default=2.0, help="AnkiConnect request latency")
+    parser.add_argument("--anki-error-rate", type=float, default=0.0, help="Fraction of AnkiConnect writes that fail")
+    parser.add_argument("--audio-seconds", type=float, default=2.0, help="Length of each synthesized clip")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="Fraction of repeated sentences")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the deck and stub randomness")
+    parser.add_argument("--output", help="Write results to this JSON file instead of stdout")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # Child process: run one case and report it on stdout
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    results = []
+    for size in args.notes:
+        for mode in args.modes:
+            case = {
+                "mode": mode, "notes": size, "workers": args.workers, "seed": args.seed,
+                "vv_latency_ms": args.vv_latency_ms, "vv_ms_per_char": args.vv_ms_per_char,
+                "vv_concurrency": args.vv_concurrency, "vv_error_rate": args.vv_error_rate,
+                "anki_latency_ms": args.anki_latency_ms, "anki_error_rate": args.anki_error_rate,
+                "audio_seconds": args.audio_seconds, "duplicate_ratio": args.duplicate_ratio,
+            }
+            print(f"Running {mode} with {size} notes...", file=sys.stderr)
+            completed = subprocess.run([sys.executable, "-m", "benchmarks.run_benchmark", "--case", json.dumps(case)],
+                                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                       stdout=subprocess.PIPE, text=True)
+            if completed.returncode != 0:
+                results.append({"mode": mode, "notes": size, "error": f"exit code {completed.returncode}"})
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f"  {result['notes_per_sec']} notes/sec, peak RSS {result['peak_rss_mb']} MB "
+                  f"(encoders {result['encoder_peak_rss_mb']} MB)", file=sys.stderr)
+            results.append(result)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "case")},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import io
+import wave
+import random
+import asyncio
+import zipfile
+import threading
+import multiprocessing
+from typing import Callable, Dict, List, Optional, Tuple
+from aiohttp import web
+
+
+class StubConfig:
+    """Latency, payload and failure settings for one stub server."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter: float = 0.2, error_rate: float = 0.0,
+                 concurrency: Optional[int] = None, seed: int = 0):
+        self.latency_ms = latency_ms
+        # Each delay is latency_ms scaled by a uniform factor in [1 - jitter, 1 + jitter]
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Requests served at once; more wait in line, like a single-engine VOICEVOX
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+
+    def delay(self, extra_ms: float = 0.0) -> float:
+        factor = self.random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.0, (self.latency_ms + extra_ms) * factor / 1000)
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+
+def make_wav(seconds: float, sample_rate: int = 24000) -> bytes:
+    """Silent mono 16-bit WAV of the given length, the same format VOICEVOX returns."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b"\0\0" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+def synthetic_deck(size: int, duplicate_ratio: float = 0.1, term_ratio: float = 0.7, seed: int = 0) -> List[Dict]:
+    """Notes shaped like AnkiConnect's notesInfo output, all missing audio.
+
+    `duplicate_ratio` of the sentences repeat an earlier one, which exercises
+    the synthesis cache and media reuse the way real mining decks do.
+    """
+    rng = random.Random(seed)
+    kana = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+    sentences = []
+    notes = []
+    for index in range(size):
+        if sentences and rng.random() < duplicate_ratio:
+            sentence = rng.choice(sentences)
+        else:
+            sentence = "".join(rng.choice(kana) for _ in range(rng.randint(8, 40))) + "。"
+            sentences.append(sentence)
+        term = "".join(rng.choice(kana) for _ in range(rng.randint(2, 6))) if rng.random() < term_ratio else ""
+        notes.append({
+            "noteId": 1_000_000 + index,
+            "fields": {
+                "Sentence": {"value": sentence, "order": 0},
+                "Sentence Audio": {"value": "", "order": 1},
+                "Term": {"value": term, "order": 2},
+                "Term Audio": {"value": "", "order": 3},
+            },
+        })
+    return notes
+
+
+class StubVoiceVox:
+    """Stand-in for the VOICEVOX engine's REST API."""
+
+    def __init__(self, config: StubConfig, audio_seconds: float = 2.0, ms_per_char: float = 0.0):
+        self.config = config
+        self.wav = make_wav(audio_seconds)
+        self.ms_per_char = ms_per_char
+        self.counts: Dict[str, int] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes([
+            web.get("/", self.root),
+            web.get("/version", self.version),
+            web.get("/speakers", self.speakers),
+            web.post("/audio_query", self.audio_query),
+            web.post("/synthesis", self.synthesis),
+            web.post("/multi_synthesis", self.multi_synthesis),
+        ])
+        return app
+
+    async def _work(self, name: str, extra_ms: float = 0.0):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if self.config.concurrency and self._semaphore is None:
+            # Created lazily so it belongs to the server's event loop
+            self._semaphore = asyncio.Semaphore(self.config.concurrency)
+        if self._semaphore is not None:
+            async with self._semaphore:
+                await asyncio.sleep(self.config.delay(extra_ms))
+        else:
+            await asyncio.sleep(self.config.delay(extra_ms))
+        if self.config.fails():
+            self.counts["errors"] = self.counts.get("errors", 0) + 1
+            raise web.HTTPInternalServerError(text="stub failure")
+
+    async def root(self, request):
+        return web.Response(text="VOICEVOX stub")
+
+    async def version(self, request):
+        return web.json_response("0.0.0-stub")
+
+    async def speakers(self, request):
+        return web.json_response([{"name": "四国めたん", "styles": [{"name": "あまあま", "id": 0}]}])
+
+    async def audio_query(self, request):
+        text = request.query.get("text", "")
+        await self._work("audio_query")
+        moras = [{"text": char, "vowel": "a", "vowel_length": 0.1, "pitch": 5.5} for char in text]
+        return web.json_response({"accent_phrases": [{"moras": moras, "accent": 1}], "speedScale": 1.0,
+                                  "pitchScale": 0.0, "intonationScale": 1.0, "volumeScale": 1.0,
+                                  "outputSamplingRate": 24000, "outputStereo": False, "kana": text})
+
+    async def synthesis(self, request):
+        query = await request.json()
+        await self._work("synthesis", self.ms_per_char * len(query.get("kana", "")))
+        return web.Response(body=self.wav, content_type="audio/wav")
+
+    async def multi_synthesis(self, request):
+        queries = await request.json()
+        characters = sum(len(query.get("kana", "")) for query in queries)
+        await self._work("multi_synthesis", self.ms_per_char * characters)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for index, _ in enumerate(queries, 1):
+                archive.writestr(f"{index:03}.wav", self.wav)
+        return web.Response(body=buffer.getvalue(), content_type="application/zip")
+
+
+class StubAnkiConnect:
+    """Stand-in for AnkiConnect holding a synthetic deck in memory."""
+
+    def __init__(self, config: StubConfig, notes: List[Dict]):
+        self.config = config
+        self.notes = {note["noteId"]: note for note in notes}
+        self.media: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=256 * 1024 * 1024)
+        app.add_routes([web.post("/", self.handle)])
+        return app
+
+    async def handle(self, request):
+        body = await request.json()
+        await asyncio.sleep(self.config.delay())
+        return web.json_response(self._wrap(body["action"], body.get("params", {})))
+
+    def _wrap(self, action: str, params: Dict) -> Dict:
+        try:
+            return {"result": self._dispatch(action, params), "error": None}
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
+    def _dispatch(self, action: str, params: Dict):
+        self.counts[action] = self.counts.get(action, 0) + 1
+        if action == "multi":
+            return [self._wrap(item["action"], item.get("params", {})) for item in params["actions"]]
+        if action in ("storeMediaFile", "updateNoteFields") and self.config.fails():
+            self.counts["errors"] = self.counts.get("errors", 0) + 1
+            raise Exception("stub failure")
+        if action == "version":
+            return 6
+        if action == "findNotes":
+            return [note_id for note_id, note in self.notes.items()
+                    if not note["fields"]["Sentence Audio"]["value"] or
+                    (note["fields"]["Term"]["value"] and not note["fields"]["Term Audio"]["value"])]
+        if action == "notesInfo":
+            return [self.notes[note_id] for note_id in params["notes"] if note_id in self.notes]
+        if action == "storeMediaFile":
+            self.media[params["filename"]] = len(params.get("data") or "")
+            return params["filename"]
+        if action == "getMediaFilesNames":
+            pattern = params.get("pattern", "*")
+            return list(self.media) if pattern == "*" else [name for name in self.media if name == pattern]
+        if action == "updateNoteFields":
+            note = self.notes[params["note"]["id"]]
+            for field, value in params["note"]["fields"].items():
+                note["fields"].setdefault(field, {"value": ""})["value"] = value
+            return None
+        raise Exception(f"unsupported action: {action}")
+
+
+class StubServers:
+    """Runs the VOICEVOX and AnkiConnect stubs on their own event loop thread.
+
+    A separate loop keeps the simulated server work from competing with the
+    client under test for the same event loop.
+    """
+
+    def __init__(self, voicevox: StubVoiceVox, anki: StubAnkiConnect, host: str = "127.0.0.1"):
+        self.voicevox = voicevox
+        self.anki = anki
+        self.host = host
+        self.voicevox_url = ""
+        self.anki_url = ""
+        self._loop = asyncio.new_event_loop()
+        self._runners = []
+        self._thread: Optional[threading.Thread] = None
+
+    async def _start(self):
+        urls = []
+        for app in (self.voicevox.app(), self.anki.app()):
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, 0)
+            await site.start()
+            self._runners.append(runner)
+            port = site._server.sockets[0].getsockname()[1]
+            urls.append(f"http://{self.host}:{port}")
+        self.voicevox_url, self.anki_url = urls
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        async def cleanup():
+            for runner in self._runners:
+                await runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def _serve(build: Callable[..., Tuple[StubVoiceVox, StubAnkiConnect]], args: tuple, conn):
+    voicevox, anki = build(*args)
+    servers = StubServers(voicevox, anki).start()
+    conn.send((servers.voicevox_url, servers.anki_url))
+    # Serve until the parent asks for the results
+    conn.recv()
+    servers.stop()
+    conn.send({"voicevox_requests": voicevox.counts, "anki_requests": anki.counts, "notes": anki.notes,
+               "peak_rss": _peak_rss()})
+    conn.close()
+
+
+def _peak_rss() -> Optional[int]:
+    # Raw ru_maxrss: kilobytes on Linux, bytes on macOS
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class StubProcess:
+    """Runs StubServers in a child process.
+
+    The stubs then neither compete with the client under test for its GIL
+    nor count toward its memory. `build(*args)` must be a picklable,
+    module-level function returning (StubVoiceVox, StubAnkiConnect); stop()
+    returns the stubs' request counts, final notes and peak RSS.
+    """
+
+    def __init__(self, build: Callable[..., Tuple[StubVoiceVox, StubAnkiConnect]], *args):
+        self.build = build
+        self.args = args
+        self.voicevox_url = ""
+        self.anki_url = ""
+        self._conn = None
+        self._process: Optional[multiprocessing.Process] = None
+
+    def start(self):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(self.build, self.args, child_conn), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self.voicevox_url, self.anki_url = self._conn.recv()
+        return self
+
+    def stop(self) -> Dict:
+        self._conn.send("stop")
+        results = self._conn.recv()
+        self._conn.close()
+        self._process.join()
+        return results
@@ -1,45 +1,166 @@
 import asyncio
+import logging
 import argparse
 from modules.logger import setup_logger
-from modules.audio_processor import AudioProcessor
-from modules.gui import VoiceVoxAnkiGUI
+
+# Heavier modules (tkinter, aiohttp.web, NumPy) are imported where they are
+# used, so a headless run only loads what it needs.
+
+async def run_cli(args, processor, logger, jobs=None) -> bool:
+    """Run the command on one event loop, so connections are opened once; False if it could not start."""
+    try:
+        if args.list_speakers:
+            speakers = await processor.list_speakers()
+            for speaker_name, styles in speakers:
+                print(f"Speaker: {speaker_name}")
+                for style_name, style_id in styles:
+                    print(f"  Style: {style_name} (ID: {style_id})")
+            return True
+
+        if args.sweep_media:
+            # Media maintenance only talks to AnkiConnect
+            if not await processor.anki_async.check_connection():
+                logger.error("Cannot sweep media: AnkiConnect not running.")
+                return False
+            from modules.media_sweep import MediaSweeper
+            sweeper = MediaSweeper(processor, logger, index_path=args.media_index, delete=args.delete_orphans,
+                                   workers=max(8, args.workers))
+            await sweeper.run()
+            return True
+
+        if not await processor.verify_connections():
+            logger.error("Cannot start: VOICEVOX or AnkiConnect not running.")
+            return False
+
+        if args.daemon:
+            from modules.daemon import AudioDaemon
+            daemon = AudioDaemon(processor, args.deck, logger, poll_interval=args.poll_interval,
+                                 full_scan_interval=args.full_scan_interval, control_port=args.control_port)
+            await daemon.run()
+        elif args.gui:
+            # Only resolve the style here; the GUI processes decks on its own event loop thread
+            await processor.run()
+        else:
+            await processor.run(args.deck, jobs=jobs)
+        return True
+    finally:
+        await processor.close()
 
 def main():
     parser = argparse.ArgumentParser(description="Generate audio for Anki cards using VOICEVOX.")
     parser.add_argument("--deck", help="Name of the Anki deck to process")
     parser.add_argument("--gui", action="store_true", help="Run with GUI")
+    parser.add_argument("--jobs", help="JSON (or YAML) file listing decks to process, each with its own fields and style")
     parser.add_argument("--dry-run", action="store_true", help="Simulate processing without updating notes")
     parser.add_argument("--limit", type=int, help="Limit number of notes to process")
     parser.add_argument("--list-speakers", action="store_true", help="List available VOICEVOX speakers and styles")
     parser.add_argument("--style-id", type=int, help="Override default style ID for VOICEVOX")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent workers per pipeline stage (1 = serial)")
+    parser.add_argument("--pool-size", type=int, help="Max pooled VOICEVOX connections (default: max(8, workers))")
+    parser.add_argument("--cache-dir", default="cache", help="Directory for the synthesis cache")
+    parser.add_argument("--cache-size-mb", type=int, default=512, help="Max size of the synthesis cache in MB")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk WAV and audio query caches (and reuse across runs); "
+                             "identical clips within a run still share one media file")
+    parser.add_argument("--inline-limit-kb", type=int, default=8192,
+                        help="Upload MP3s up to this size inline; larger ones via a temp file (0 = always use files)")
+    parser.add_argument("--encoders", type=int, help="MP3 encoder processes (default: number of CPU cores)")
+    parser.add_argument("--anki-batch-size", type=int, default=50,
+                        help="AnkiConnect writes per multi request in pipeline mode (1 = no batching)")
+    parser.add_argument("--anki-flush-ms", type=int, default=200, help="Max wait before sending a partial batch")
+    parser.add_argument("--anki-timeout", type=float, default=120.0, help="AnkiConnect request timeout in seconds")
+    parser.add_argument("--fetch-chunk-size", type=int, default=500, help="Note IDs per notesInfo request")
+    parser.add_argument("--journal", default="run_journal.sqlite3", help="Path of the run journal database")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reuse clips a previous interrupted run already uploaded instead of regenerating them")
+    parser.add_argument("--synth-batch-size", type=int, default=1,
+                        help="Texts per VOICEVOX multi_synthesis call in pipeline mode (1 = no batching)")
+    parser.add_argument("--synth-batch-ms", type=int, default=50, help="Max wait for a synthesis batch to fill")
+    parser.add_argument("--voicevox-url", action="append", dest="voicevox_urls",
+                        help="VOICEVOX engine URL; repeat to load balance across engines (default: http://127.0.0.1:50021)")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="Disable adaptive limiting of in-flight VOICEVOX requests")
+    parser.add_argument("--speed", type=float, help="VOICEVOX speedScale (e.g. 1.1)")
+    parser.add_argument("--pitch", type=float, help="VOICEVOX pitchScale (e.g. 0.05)")
+    parser.add_argument("--intonation", type=float, help="VOICEVOX intonationScale")
+    parser.add_argument("--volume", type=float, help="VOICEVOX volumeScale")
+    parser.add_argument("--sample-rate", type=int, help="Output sampling rate, resampled by the engine (e.g. 16000)")
+    parser.add_argument("--trim-silence", action="store_true", help="Trim leading and trailing silence from clips")
+    parser.add_argument("--silence-db", type=float, default=-50.0, help="Level in dBFS below which audio is silence")
+    parser.add_argument("--normalize", choices=["peak", "loudness"], help="Normalize each clip's peak or loudness")
+    parser.add_argument("--target-db", type=float,
+                        help="Normalization target in dBFS (default: -1 for peak, -20 for loudness)")
+    parser.add_argument("--metrics-json", help="Write a JSON summary of per-stage timings after each run")
+    parser.add_argument("--metrics-prom", help="Write per-stage metrics in Prometheus text format")
+    parser.add_argument("--anki-url", default="http://127.0.0.1:8765", help="AnkiConnect URL")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Keep running and process notes added or edited in --deck as they appear")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between daemon polls")
+    parser.add_argument("--full-scan-interval", type=float, default=3600.0,
+                        help="Seconds between full deck scans in daemon mode")
+    parser.add_argument("--control-port", type=int, default=8766,
+                        help="Local port for the daemon's status endpoint (0 disables it)")
+    parser.add_argument("--sweep-media", action="store_true",
+                        help="Relink notes from duplicate clips to one copy and report clips no note uses")
+    parser.add_argument("--delete-orphans", action="store_true", help="With --sweep-media, delete unused clips")
+    parser.add_argument("--media-index", default="media_index.sqlite3",
+                        help="Database of media hashes, so repeated sweeps only hash new files")
+    parser.add_argument("--speaker-cache-ttl", type=float, default=86400.0,
+                        help="Seconds to reuse the cached VOICEVOX speaker list (0 = always ask the engine)")
+    parser.add_argument("--gui-log-lines", type=int, default=5000, help="Max lines kept in the GUI log view")
+    parser.add_argument("--log-level", default="DEBUG", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Lowest level logged at all; INFO skips debug records for speed")
     args = parser.parse_args()
 
-    logger = setup_logger()
-    processor = AudioProcessor(logger, dry_run=args.dry_run, limit=args.limit, style_id=args.style_id)
+    # Prosody overrides are applied to stored audio queries, so changing them skips the query step
+    query_params = {name: value for name, value in (("speedScale", args.speed), ("pitchScale", args.pitch),
+                                                    ("intonationScale", args.intonation),
+                                                    ("volumeScale", args.volume),
+                                                    ("outputSamplingRate", args.sample_rate)) if value is not None}
 
-    if args.list_speakers:
-        speakers = asyncio.run(processor.voicevox.list_speakers())
-        for speaker_name, styles in speakers:
-            print(f"Speaker: {speaker_name}")
-            for style_name, style_id in styles:
-                print(f"  Style: {style_name} (ID: {style_id})")
+    logger = setup_logger(getattr(logging, args.log_level))
+    if not (args.deck or args.gui or args.jobs or args.list_speakers or args.sweep_media):
+        logger.error("Must specify --deck, --jobs or --gui")
         return
 
-    if not args.deck and not args.gui:
-        logger.error("Must specify --deck or --gui")
+    if args.daemon and not args.deck:
+        logger.error("--daemon needs --deck")
         return
 
-    if not processor.check_connections():
-        logger.error("Cannot start: VOICEVOX or AnkiConnect not running.")
-        return
+    from modules.audio_processor import AudioProcessor
+    processor = AudioProcessor(logger, dry_run=args.dry_run, limit=args.limit, style_id=args.style_id,
+                               workers=args.workers, pool_size=args.pool_size,
+                               cache_dir=None if args.no_cache else args.cache_dir, cache_size_mb=args.cache_size_mb,
+                               inline_limit_kb=args.inline_limit_kb, encoders=args.encoders,
+                               anki_batch_size=args.anki_batch_size, anki_flush_interval=args.anki_flush_ms / 1000,
+                               anki_timeout=args.anki_timeout, fetch_chunk_size=args.fetch_chunk_size,
+                               journal_path=args.journal, resume=args.resume,
+                               synth_batch_size=args.synth_batch_size, synth_batch_delay=args.synth_batch_ms / 1000,
+                               voicevox_urls=args.voicevox_urls, adaptive_concurrency=not args.no_adaptive,
+                               query_params=query_params, metrics_json=args.metrics_json,
+                               metrics_prometheus=args.metrics_prom, anki_url=args.anki_url,
+                               trim_silence=args.trim_silence, silence_threshold_db=args.silence_db,
+                               normalize=args.normalize, target_db=args.target_db,
+                               speaker_cache_ttl=args.speaker_cache_ttl)
 
-    asyncio.run(processor.initialize())
+    jobs = None
+    if args.jobs and not (args.list_speakers or args.sweep_media):
+        from modules.jobs import load_job_file
+        try:
+            jobs = load_job_file(args.jobs, processor.job_defaults())
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot read job file {args.jobs}: {e}")
+            return
+
+    try:
+        started = asyncio.run(run_cli(args, processor, logger, jobs))
+    except KeyboardInterrupt:
+        logger.info("Daemon stopped" if args.daemon else "Interrupted")
+        return
 
-    if args.gui:
-        gui = VoiceVoxAnkiGUI(processor)
+    if started and args.gui:
+        from modules.gui import VoiceVoxAnkiGUI
+        gui = VoiceVoxAnkiGUI(processor, log_lines=args.gui_log_lines)
         gui.start()
-    else:
-        asyncio.run(processor.batch_process_deck(args.deck))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,107 +1,255 @@
-import requests
+import aiohttp
 import os
+import math
+import time
 import uuid
-from pydub import AudioSegment
+import base64
+import asyncio
+from typing import Callable, Dict, List, Optional
+from .metrics import Metrics
 
-class AnkiClient:
-    def __init__(self, logger, url: str = "http://127.0.0.1:8765"):
+
+# (text field, audio field) pairs checked when no custom names are given
+DEFAULT_FIELD_PAIRS = (("Sentence", "Sentence Audio"), ("Term", "Term Audio"))
+
+
+def _quote_search(text: str) -> str:
+    # Backslash-escape characters with special meaning in Anki search terms
+    for char in ('\\', '"', '*', '_'):
+        text = text.replace(char, f"\\{char}")
+    return text
+
+
+def build_missing_audio_query(deck_name: str, field_pairs=DEFAULT_FIELD_PAIRS) -> str:
+    """Build a findNotes query matching notes with a non-empty text field but an empty audio field.
+
+    e.g. deck:"Mining" (("Sentence:_*" "Sentence Audio:") OR ("Term:_*" "Term Audio:"))
+    """
+    clauses = [f'("{_quote_search(text_field)}:_*" "{_quote_search(audio_field)}:")'
+               for text_field, audio_field in field_pairs]
+    deck = deck_name.replace('"', '\\"')
+    return f'deck:"{deck}" ({" OR ".join(clauses)})'
+
+
+def filter_notes_missing_audio(notes: list, field_pairs=DEFAULT_FIELD_PAIRS) -> list:
+    filtered_notes = []
+    for note in notes:
+        fields = note["fields"]
+        # Only include notes that have a text field but are missing the corresponding audio
+        for text_field, audio_field in field_pairs:
+            if fields.get(text_field, {}).get("value", "") and not fields.get(audio_field, {}).get("value", ""):
+                filtered_notes.append(note)
+                break
+    return filtered_notes
+
+
+class AsyncAnkiClient:
+    """AnkiConnect client for the event loop, sharing one pooled keep-alive session."""
+
+    def __init__(self, logger, url: str = "http://127.0.0.1:8765", inline_limit: int = 8 * 1024 * 1024,
+                 pool_size: int = 8, timeout: float = 120.0, connect_timeout: float = 10.0,
+                 metrics: Optional[Metrics] = None):
         self.url = url
         self.logger = logger
+        self.metrics = metrics or Metrics()
         self.project_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+        self.inline_limit = inline_limit
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30.0)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self.logger.debug(f"Opened AnkiConnect session (pool size {self.pool_size})")
+        return self._session
 
-    def invoke(self, action: str, **params):
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            self.logger.debug("Closed AnkiConnect session")
+        self._session = None
+
+    async def invoke(self, action: str, **params):
         request = {"action": action, "version": 6, "params": params}
         try:
-            response = requests.post(self.url, json=request).json()
-            if response.get("error"):
-                self.logger.error(f"AnkiConnect error: {response['error']}")
-                raise Exception(response["error"])
-            return response.get("result")
+            with self.metrics.track(f"anki.{action}"):
+                async with self._get_session().post(self.url, json=request) as response:
+                    # AnkiConnect answers with text/json, so skip aiohttp's content type check
+                    result = await response.json(content_type=None)
+            if result.get("error"):
+                self.logger.error(f"AnkiConnect error: {result['error']}")
+                raise Exception(result["error"])
+            return result.get("result")
         except Exception as e:
             self.logger.error(f"AnkiConnect request failed: {e}")
             raise
 
-    def check_connection(self) -> bool:
+    async def invoke_multi(self, actions: List[Dict]) -> list:
+        return await self.invoke("multi", actions=actions)
+
+    async def check_connection(self) -> bool:
         try:
-            self.invoke("version")
+            await self.invoke("version")
             self.logger.debug("AnkiConnect connection successful")
             return True
         except Exception:
             self.logger.error("AnkiConnect not running")
             return False
 
-    def get_deck_notes(self, deck_name: str) -> list:
-        try:
-            # First get all notes in the deck
-            query = f'deck:"{deck_name}"'
-            note_ids = self.invoke("findNotes", query=query)
-            if not note_ids:
-                self.logger.warning(f"No notes found in deck {deck_name}")
-                return []
-            
-            # Get detailed info for all notes
-            notes = self.invoke("notesInfo", notes=note_ids)
-            
-            # Filter notes that have empty audio fields
-            filtered_notes = []
-            for note in notes:
-                fields = note["fields"]
-                sentence_audio = fields.get("Sentence Audio", {}).get("value", "")
-                term_audio = fields.get("Term Audio", {}).get("value", "")
-                
-                # Only include notes that have either sentence or term field but missing corresponding audio
-                sentence = fields.get("Sentence", {}).get("value", "")
-                term = fields.get("Term", {}).get("value", "")
-                
-                if (sentence and not sentence_audio) or (term and not term_audio):
-                    filtered_notes.append(note)
-            
-            self.logger.debug(f"Found {len(filtered_notes)} notes with missing audio in deck {deck_name}")
-            return filtered_notes
-        except Exception as e:
-            self.logger.error(f"Failed to retrieve notes from deck {deck_name}: {e}")
-            return []
+    async def media_exists(self, filename: str) -> bool:
+        return filename in (await self.invoke("getMediaFilesNames", pattern=filename) or [])
 
-    def store_audio(self, audio_data: bytes, filename: str) -> str:
-        try:
-            # Save temp WAV file in project directory
-            temp_wav_filename = f"temp_{uuid.uuid4()}.wav"
-            temp_wav_path = os.path.join(self.project_dir, temp_wav_filename)
-            self.logger.debug(f"Writing audio to temp WAV file: {temp_wav_path}")
-
-            # Write audio data to temp WAV file
-            with open(temp_wav_path, "wb") as temp_file:
-                temp_file.write(audio_data)
-                temp_file.flush()
-
-            # Verify temp WAV file exists
-            if not os.path.exists(temp_wav_path):
-                self.logger.error(f"Temp WAV file not created: {temp_wav_path}")
-                raise FileNotFoundError(f"Temp WAV file not created: {temp_wav_path}")
-
-            # Convert WAV to MP3
-            temp_mp3_filename = f"temp_{uuid.uuid4()}.mp3"
-            temp_mp3_path = os.path.join(self.project_dir, temp_mp3_filename)
-            self.logger.debug(f"Converting WAV to MP3: {temp_mp3_path}")
-            
-            audio = AudioSegment.from_wav(temp_wav_path)
-            audio.export(temp_mp3_path, format="mp3", bitrate="64k")
-
-            # Store in Anki media
-            final_filename = f"{filename}.mp3"
-            self.logger.debug(f"Storing audio in Anki: {final_filename}")
-            self.invoke("storeMediaFile", filename=final_filename, path=temp_mp3_path)
-
-            # Clean up temp files
+    async def iter_deck_notes(self, deck_name: str, chunk_size: int = 500, limit: Optional[int] = None,
+                              field_pairs=DEFAULT_FIELD_PAIRS, since: Optional[float] = None,
+                              on_found: Optional[Callable[[int], None]] = None):
+        """Yield notes missing audio, fetching `notesInfo` one chunk of IDs at a time.
+
+        The empty-field filter runs inside Anki's search, so only notes that
+        need work are transferred. Processing can start as soon as the first
+        chunk arrives. With `limit`, each chunk asks only for as many notes as
+        are still needed, and none are requested once it is reached. With `since` (a Unix time), only notes added or
+        edited after it are returned. A failed findNotes or notesInfo call
+        raises, so callers can tell "no notes" from "could not ask".
+
+        The search and each chunk are timed as the `get_deck_notes` stage;
+        time spent by the consumer between chunks is not counted.
+        """
+        query = build_missing_audio_query(deck_name, field_pairs)
+        if since is not None:
+            # edited:N counts whole days from Anki's day rollover, not rolling 24 hours,
+            # so ask for one day more; the note mod time narrows it down below
+            days = max(1, math.ceil((time.time() - since) / 86400))
+            query = f"{query} edited:{days + 1}"
+        with self.metrics.track("get_deck_notes"):
+            note_ids = await self.invoke("findNotes", query=query)
+        if not note_ids:
+            if since is None:
+                self.logger.warning(f"No notes missing audio found in deck {deck_name}")
+            return
+        # Polls keep finding today's notes that still lack audio; only full scans log at info
+        log = self.logger.info if since is None else self.logger.debug
+        log(f"Found {len(note_ids)} notes missing audio in deck {deck_name}")
+        if on_found is not None:
+            on_found(len(note_ids))
+        self.logger.debug(f"Search query: {query}; fetching in chunks of {chunk_size}")
+
+        yielded = 0
+        start = 0
+        while start < len(note_ids):
+            # With a limit, never ask for more notes than are still needed
+            size = min(chunk_size, limit - yielded) if limit else chunk_size
+            with self.metrics.track("get_deck_notes"):
+                notes = await self.invoke("notesInfo", notes=note_ids[start:start + size])
+            start += size
+            for note in filter_notes_missing_audio(notes, field_pairs):
+                if since is not None and note.get("mod", since) < since:
+                    continue
+                yield note
+                yielded += 1
+                if limit and yielded >= limit:
+                    return
+
+    async def upload_mp3(self, mp3_data: bytes, filename: str) -> str:
+        final_filename = f"{filename}.mp3"
+        self.logger.debug("Storing audio in Anki: %s", final_filename)
+        if len(mp3_data) <= self.inline_limit:
+            await self.invoke("storeMediaFile", filename=final_filename, data=base64.b64encode(mp3_data).decode("ascii"))
+        else:
+            temp_mp3_path = os.path.join(self.project_dir, f"temp_{uuid.uuid4()}.mp3")
+            with open(temp_mp3_path, "wb") as temp_file:
+                temp_file.write(mp3_data)
             try:
-                os.remove(temp_wav_path)
-                os.remove(temp_mp3_path)
-                self.logger.debug(f"Deleted temp files: {temp_wav_path}, {temp_mp3_path}")
-            except Exception as e:
-                self.logger.warning(f"Failed to delete temp files: {e}")
-
-            self.logger.info(f"Stored audio: {final_filename}")
-            return final_filename
+                await self.invoke("storeMediaFile", filename=final_filename, path=temp_mp3_path)
+            finally:
+                try:
+                    os.remove(temp_mp3_path)
+                except OSError as e:
+                    self.logger.warning(f"Failed to delete temp file {temp_mp3_path}: {e}")
+
+        self.logger.info(f"Stored audio: {final_filename}")
+        return final_filename
+
+
+class AnkiBatcher:
+    """Coalesces AnkiConnect writes from many coroutines into `multi` requests.
+
+    Calls queue up until `batch_size` actions are pending or `flush_interval`
+    seconds pass, then go out as one HTTP round trip. Each caller awaits its
+    own result, and a failing action only raises for the caller that sent it.
+    """
+
+    def __init__(self, anki: AsyncAnkiClient, logger, batch_size: int = 50, flush_interval: float = 0.2):
+        self.anki = anki
+        self.logger = logger
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending = set()
+
+    async def invoke(self, action: str, **params):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(({"action": action, "version": 6, "params": params}, future))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self.flush)
+        # Time from queueing to result, including the wait for the batch to fill
+        with self.anki.metrics.track(f"anki.{action}"):
+            return await future
+
+    async def store_media(self, mp3_data: bytes, filename: str) -> str:
+        if len(mp3_data) > self.anki.inline_limit:
+            return await self.anki.upload_mp3(mp3_data, filename)
+        final_filename = f"{filename}.mp3"
+        await self.invoke("storeMediaFile", filename=final_filename, data=base64.b64encode(mp3_data).decode("ascii"))
+        self.logger.info(f"Stored audio: {final_filename}")
+        return final_filename
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list):
+        self.logger.debug("Sending %d AnkiConnect actions in one multi request", len(batch))
+        try:
+            results = await self.anki.invoke_multi([action for action, _ in batch])
         except Exception as e:
-            self.logger.error(f"Failed to store audio {filename}: {e}")
-            raise
\ No newline at end of file
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        results = list(results or [])
+        results += [{"result": None, "error": "missing result in multi response"}] * (len(batch) - len(results))
+        for (action, future), item in zip(batch, results):
+            if future.done():
+                continue
+            error = item.get("error") if isinstance(item, dict) else None
+            if error:
+                self.logger.error(f"AnkiConnect {action['action']} failed: {error}")
+                future.set_exception(Exception(error))
+            else:
+                future.set_result(item.get("result") if isinstance(item, dict) else item)
+
+    async def close(self):
+        """Flush anything still queued and wait for in-flight batches."""
+        self.flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional
+
+
+class AudioCache:
+    """On-disk, content-addressed cache of synthesized WAV clips.
+
+    Clips are stored as ``<dir>/<key[:2]>/<key>.wav`` where the key is a hash of
+    the cleaned text, style ID and query parameters. A SQLite index tracks sizes
+    and last access times for size-bounded LRU eviction, plus the Anki media
+    file each key was uploaded as, so identical clips share one media file.
+    """
+
+    def __init__(self, cache_dir: str, logger, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.media_hits = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        # Hits update last_access on the event loop; WAL with NORMAL sync keeps commits from fsyncing
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS clips (key TEXT PRIMARY KEY, size INTEGER, last_access REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS clips_last_access ON clips (last_access)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS media (key TEXT PRIMARY KEY, filename TEXT)")
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, style_id: Optional[int], params: Optional[Dict] = None) -> str:
+        payload = json.dumps({"text": text, "style_id": style_id, "params": params or {}},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            try:
+                with open(self._path(key), "rb") as f:
+                    audio = f.read()
+            except OSError:
+                self.misses += 1
+                row = self._db.execute("SELECT size FROM clips WHERE key = ?", (key,)).fetchone()
+                if row:
+                    # The file was removed behind our back; keep total_bytes in step with the index
+                    self.total_bytes -= row[0]
+                    self._db.execute("DELETE FROM clips WHERE key = ?", (key,))
+                    self._db.commit()
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE clips SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return audio
+
+    def put(self, key: str, audio: bytes):
+        path = self._path(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+
+            row = self._db.execute("SELECT size FROM clips WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.total_bytes -= row[0]
+            self._db.execute("INSERT OR REPLACE INTO clips (key, size, last_access) VALUES (?, ?, ?)",
+                             (key, len(audio), time.time()))
+            self.total_bytes += len(audio)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            row = self._db.execute("SELECT key, size FROM clips ORDER BY last_access LIMIT 1").fetchone()
+            if not row:
+                break
+            key, size = row
+            try:
+                os.remove(self._path(key))
+            except OSError as e:
+                self.logger.warning(f"Failed to evict cached clip {key}: {e}")
+            self._db.execute("DELETE FROM clips WHERE key = ?", (key,))
+            self.total_bytes -= size
+            self.evictions += 1
+            self.logger.debug("Evicted cached clip %s (%d bytes)", key, size)
+
+    def get_media(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT filename FROM media WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        self.media_hits += 1
+        return row[0]
+
+    def set_media(self, key: str, filename: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO media (key, filename) VALUES (?, ?)", (key, filename))
+            self._db.commit()
+
+    def forget_media(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM media WHERE key = ?", (key,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "media_hits": self.media_hits,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
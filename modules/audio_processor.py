@@ -1,16 +1,82 @@
+import os
 import uuid
 import asyncio
-from typing import List, Dict, Optional
-from .voicevox_client import VoiceVoxClient
-from .anki_client import AnkiClient
+from typing import List, Dict, Optional, Tuple
+from .voicevox_client import VoiceVoxClient, SynthesisBatcher
+from .anki_client import AsyncAnkiClient, AnkiBatcher
+from .audio_cache import AudioCache
+from .query_cache import QueryCache
+from .encoder import Mp3Encoder
+from .journal import RunJournal, SYNTHESIZED, STORED
+from .pipeline import NotePipeline
+from .metrics import Metrics
+from .jobs import DeckJob, interleave
 
 class AudioProcessor:
     def __init__(self, logger, dry_run: bool = False, limit: Optional[int] = None, style_id: Optional[int] = None,
                  sentence_field: str = "Sentence", sentence_audio_field: str = "Sentence Audio",
-                 term_field: str = "Term", term_audio_field: str = "Term Audio"):
+                 term_field: str = "Term", term_audio_field: str = "Term Audio", workers: int = 1,
+                 pool_size: Optional[int] = None, cache_dir: Optional[str] = "cache", cache_size_mb: int = 512,
+                 inline_limit_kb: int = 8192, encoders: Optional[int] = None,
+                 anki_batch_size: int = 50, anki_flush_interval: float = 0.2, anki_timeout: float = 120.0,
+                 fetch_chunk_size: int = 500, journal_path: Optional[str] = "run_journal.sqlite3",
+                 resume: bool = False, synth_batch_size: int = 1, synth_batch_delay: float = 0.05,
+                 voicevox_urls: Optional[List[str]] = None, adaptive_concurrency: bool = True,
+                 query_params: Optional[Dict[str, float]] = None, metrics_json: Optional[str] = None,
+                 metrics_prometheus: Optional[str] = None, anki_url: str = "http://127.0.0.1:8765",
+                 trim_silence: bool = False, silence_threshold_db: float = -50.0, normalize: Optional[str] = None,
+                 target_db: Optional[float] = None, speaker_cache_ttl: float = 86400.0):
         self.logger = logger
-        self.voicevox = VoiceVoxClient(logger=logger, style_id=style_id)
-        self.anki = AnkiClient(logger=logger)
+        # Shared by every client so one run summary covers VOICEVOX, ffmpeg and AnkiConnect
+        self.metrics = Metrics()
+        self.metrics_json = metrics_json
+        self.metrics_prometheus = metrics_prometheus
+        self.workers = max(1, workers)
+        self.pool_size = pool_size
+        self.voicevox_urls = voicevox_urls
+        self.cache_dir = cache_dir
+        self.cache_size_mb = cache_size_mb
+        # The caches and the journal are opened on first use, so commands such as
+        # --list-speakers create no files
+        self._cache: Optional[AudioCache] = None
+        self._query_cache: Optional[QueryCache] = None
+        self._journal: Optional[RunJournal] = None
+        self.query_params = query_params
+        self.style_id = style_id
+        self.speaker_cache_ttl = speaker_cache_ttl
+        self.voicevox = VoiceVoxClient(logger=logger, style_id=style_id, pool_size=pool_size or max(8, self.workers),
+                                       urls=voicevox_urls, adaptive=adaptive_concurrency, query_params=query_params,
+                                       metrics=self.metrics,
+                                       speaker_cache=os.path.join(cache_dir, "speakers.json") if cache_dir else None,
+                                       speaker_cache_ttl=speaker_cache_ttl)
+        self.adaptive_concurrency = adaptive_concurrency
+        self.inline_limit_kb = inline_limit_kb
+        self.anki_timeout = anki_timeout
+        self.anki_url = anki_url
+        self.anki_async = AsyncAnkiClient(logger=logger, url=anki_url, inline_limit=inline_limit_kb * 1024,
+                                          pool_size=max(8, self.workers), timeout=anki_timeout, metrics=self.metrics)
+        self.encoders = encoders
+        self.trim_silence = trim_silence
+        self.silence_threshold_db = silence_threshold_db
+        self.normalize = normalize
+        self.target_db = target_db
+        # Clips go to the encoder untouched unless trimming or normalization is on
+        self.postprocessor = None
+        if trim_silence or normalize:
+            # NumPy is only loaded when post-processing is enabled
+            from .postprocess import AudioPostProcessor
+            self.postprocessor = AudioPostProcessor(trim_silence=trim_silence, silence_threshold_db=silence_threshold_db,
+                                                    normalize=normalize, target_db=target_db)
+        self.encoder = Mp3Encoder(logger, max_workers=encoders, metrics=self.metrics, postprocessor=self.postprocessor)
+        self.anki_batch_size = anki_batch_size
+        self.anki_flush_interval = anki_flush_interval
+        self.batcher: Optional[AnkiBatcher] = None
+        self.fetch_chunk_size = fetch_chunk_size
+        self.journal_path = journal_path
+        self.resume = resume
+        self.synth_batch_size = synth_batch_size
+        self.synth_batch_delay = synth_batch_delay
+        self.synth_batcher: Optional[SynthesisBatcher] = None
         self.dry_run = dry_run
         self.limit = limit
         self.dry_run_updates = []
@@ -18,13 +84,96 @@ class AudioProcessor:
         self.sentence_audio_field = sentence_audio_field
         self.term_field = term_field
         self.term_audio_field = term_audio_field
+        self.pipeline: Optional[NotePipeline] = None
+        # Progress of the current batch, read by the GUI and the daemon status endpoint
+        self.notes_total: Optional[int] = None
+        self.notes_done = 0
+        # Decks whose notes could not be (fully) fetched during the last batch
+        self.fetch_errors: List[str] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._verified_media = set()
+        # Clips stored during the current run, so duplicates are linked even without the cache
+        self._run_media: Dict[str, str] = {}
+
+    @property
+    def cache(self) -> Optional[AudioCache]:
+        if self._cache is None and self.cache_dir:
+            self._cache = AudioCache(self.cache_dir, self.logger, max_bytes=self.cache_size_mb * 1024 * 1024)
+        return self._cache
+
+    @property
+    def query_cache(self) -> Optional[QueryCache]:
+        if self._query_cache is None and self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._query_cache = QueryCache(os.path.join(self.cache_dir, "queries.sqlite3"), self.logger)
+        return self._query_cache
+
+    @property
+    def journal(self) -> Optional[RunJournal]:
+        if self._journal is None and self.journal_path and not self.dry_run:
+            self._journal = RunJournal(self.journal_path, self.logger)
+        return self._journal
 
     async def initialize(self):
+        if self.cache_dir:
+            # Processing runs keep the speaker list next to the other caches
+            os.makedirs(self.cache_dir, exist_ok=True)
         await self.voicevox.initialize()
 
-    def check_connections(self) -> bool:
-        voicevox_ok = asyncio.run(self.voicevox.check_connection())
-        anki_ok = self.anki.check_connection()
+    async def close(self):
+        await self.voicevox.close()
+        await self.anki_async.close()
+        self.encoder.close()
+        self.voicevox.query_cache = None
+        # Closed stores are reopened if the processor is used again
+        for name in ("_cache", "_query_cache", "_journal"):
+            store = getattr(self, name)
+            if store is not None:
+                store.close()
+                setattr(self, name, None)
+
+    def settings(self, **overrides) -> Dict[str, object]:
+        """Constructor arguments for a processor like this one, with `overrides` applied."""
+        settings = dict(
+            logger=self.logger, dry_run=self.dry_run, limit=self.limit, style_id=self.style_id,
+            sentence_field=self.sentence_field, sentence_audio_field=self.sentence_audio_field,
+            term_field=self.term_field, term_audio_field=self.term_audio_field, workers=self.workers,
+            pool_size=self.pool_size, cache_dir=self.cache_dir, cache_size_mb=self.cache_size_mb,
+            inline_limit_kb=self.inline_limit_kb, encoders=self.encoders, anki_batch_size=self.anki_batch_size,
+            anki_flush_interval=self.anki_flush_interval, anki_timeout=self.anki_timeout,
+            fetch_chunk_size=self.fetch_chunk_size, journal_path=self.journal_path, resume=self.resume,
+            synth_batch_size=self.synth_batch_size, synth_batch_delay=self.synth_batch_delay,
+            voicevox_urls=self.voicevox_urls, adaptive_concurrency=self.adaptive_concurrency,
+            query_params=self.query_params, metrics_json=self.metrics_json,
+            metrics_prometheus=self.metrics_prometheus, anki_url=self.anki_url, trim_silence=self.trim_silence,
+            silence_threshold_db=self.silence_threshold_db, normalize=self.normalize, target_db=self.target_db,
+            speaker_cache_ttl=self.speaker_cache_ttl,
+        )
+        settings.update(overrides)
+        return settings
+
+    async def run(self, deck_name: Optional[str] = None, jobs: Optional[List[DeckJob]] = None):
+        """Initialize, optionally process a deck or a list of deck jobs, then release pooled connections."""
+        try:
+            await self.initialize()
+            if jobs:
+                await self.process_jobs(jobs)
+            elif deck_name:
+                await self.batch_process_deck(deck_name)
+        finally:
+            await self.close()
+
+    async def list_speakers(self):
+        async with self.voicevox:
+            return await self.voicevox.list_speakers()
+
+    async def verify_connections(self) -> bool:
+        """Check that VOICEVOX and AnkiConnect are reachable, logging which one is not."""
+        voicevox_ok = await self.voicevox.check_connection()
+        anki_ok = await self.anki_async.check_connection()
+        return self._report_connections(voicevox_ok, anki_ok)
+
+    def _report_connections(self, voicevox_ok: bool, anki_ok: bool) -> bool:
         if not voicevox_ok:
             self.logger.error("VOICEVOX server not running.")
         if not anki_ok:
@@ -38,59 +187,366 @@ class AudioProcessor:
             text = text[:200]
         return text
 
-    async def process_note(self, note: Dict):
-        note_id = note["noteId"]
+    def deck_job(self, deck_name: str) -> DeckJob:
+        """A job for deck_name using this processor's field names, style and limit."""
+        return DeckJob(deck_name, **self.job_defaults())
+
+    def job_defaults(self) -> Dict:
+        return {"sentence_field": self.sentence_field, "sentence_audio_field": self.sentence_audio_field,
+                "term_field": self.term_field, "term_audio_field": self.term_audio_field, "limit": self.limit}
+
+    def note_jobs(self, note: Dict, job: Optional[DeckJob] = None) -> List[Tuple[str, str, str, int]]:
+        """Return (audio field, filename prefix, cleaned text, style ID) for each field missing audio."""
+        job = job or self.deck_job("")
+        style_id = self.voicevox.style_id if job.style_id is None else job.style_id
         fields = note["fields"]
-        sentence = fields.get(self.sentence_field, {}).get("value", "")
-        sentence_audio = fields.get(self.sentence_audio_field, {}).get("value", "")
-        term = fields.get(self.term_field, {}).get("value", "")
-        term_audio = fields.get(self.term_audio_field, {}).get("value", "")
+        sentence = fields.get(job.sentence_field, {}).get("value", "")
+        sentence_audio = fields.get(job.sentence_audio_field, {}).get("value", "")
+        term = fields.get(job.term_field, {}).get("value", "")
+        term_audio = fields.get(job.term_audio_field, {}).get("value", "")
 
-        updates = {}
+        jobs = []
         if sentence and not sentence_audio:
-            sentence = self.clean_text(sentence)
-            audio = await self.voicevox.generate_audio(sentence)
-            if audio:
-                filename = f"sentence_{note_id}_{uuid.uuid4()}"
-                if not self.dry_run:
-                    saved_filename = self.anki.store_audio(audio, filename)
+            jobs.append((job.sentence_audio_field, "sentence", self.clean_text(sentence), style_id))
+        if term and not term_audio:
+            jobs.append((job.term_audio_field, "term", self.clean_text(term), style_id))
+        return jobs
+
+    async def apply_updates(self, note_id: int, updates: Dict[str, str]):
+        try:
+            if not self.dry_run:
+                note = {"id": note_id, "fields": updates}
+                if self.batcher is not None:
+                    await self.batcher.invoke("updateNoteFields", note=note)
                 else:
-                    saved_filename = f"{filename}.mp3 (dry-run)"
-                if saved_filename:
-                    updates[self.sentence_audio_field] = f"[sound:{saved_filename}]"
+                    await self.anki_async.invoke("updateNoteFields", note=note)
+            if self.journal is not None:
+                self.journal.mark_linked(note_id, updates)
+            self.metrics.increment("notes_updated")
+            self.metrics.increment("fields_linked", len(updates))
+            self.logger.info(f"{'[DRY-RUN] ' if self.dry_run else ''}Updated note {note_id}: {updates}")
+            self.dry_run_updates.append((note_id, updates))
+        except Exception as e:
+            self.metrics.increment("note_update_failures")
+            self.logger.error(f"Failed to update note {note_id}: {e}")
 
-        if term and not term_audio:
-            term = self.clean_text(term)
-            audio = await self.voicevox.generate_audio(term)
-            if audio:
-                filename = f"term_{note_id}_{uuid.uuid4()}"
+    def text_key(self, text: str, style_id: Optional[int] = None) -> str:
+        """Identity of a clip: the same text, voice and query settings give the same key in every deck."""
+        style_id = self.voicevox.style_id if style_id is None else style_id
+        return AudioCache.make_key(text, style_id, self.voicevox.query_params)
+
+    async def resumed_media(self, note_id: int, audio_field: str, text: str,
+                            style_id: Optional[int] = None) -> Optional[str]:
+        """With --resume, return media a previous run uploaded for this field but may not have linked.
+
+        Unlinked uploads are what "Check Media" and --delete-orphans remove,
+        so the file is checked first; a missing one is forgotten and regenerated.
+        """
+        if self.journal is None or not self.resume:
+            return None
+        filename = self.journal.lookup(note_id, audio_field, self.text_key(text, style_id))
+        if not filename:
+            return None
+        exists = await self._media_in_anki(filename)
+        if not exists:
+            if exists is not None:
+                self.logger.debug("Journaled media %s missing from Anki, regenerating", filename)
+                self.journal.forget(note_id, audio_field)
+            return None
+        self.logger.debug("Resuming note %s: %s already stored as %s", note_id, audio_field, filename)
+        return filename
+
+    async def _media_in_anki(self, filename: str) -> Optional[bool]:
+        """Whether Anki still has filename; None if it could not be checked."""
+        if filename in self._verified_media:
+            return True
+        try:
+            exists = await self.anki_async.media_exists(filename)
+        except Exception as e:
+            # Treat it as missing: regenerating costs one clip, not the run
+            self.logger.warning(f"Could not check media {filename}, regenerating: {e}")
+            return None
+        if exists:
+            self._verified_media.add(filename)
+        return exists
+
+    def journal_record(self, note_id: int, audio_field: str, text: str, state: str, filename: Optional[str] = None,
+                       style_id: Optional[int] = None):
+        if self.journal is not None:
+            self.journal.record(note_id, audio_field, self.text_key(text, style_id), state, filename)
+
+    def media_filename(self, prefix: str, note_id: int, key: Optional[str]) -> str:
+        if key is None:
+            return f"{prefix}_{note_id}_{uuid.uuid4()}"
+        # Content-addressed name so every note with the same clip links one media file
+        if self.postprocessor is not None:
+            return f"voicevox_{key[:32]}_{self.postprocessor.signature()}"
+        return f"voicevox_{key[:32]}"
+
+    def _media_key(self, key: str) -> str:
+        """Cache key of the stored media; post-processing settings change the MP3 but not the WAV."""
+        if self.postprocessor is not None:
+            return f"{key}:{self.postprocessor.signature()}"
+        return key
+
+    async def claim_media(self, key: Optional[str]) -> Optional[str]:
+        """Return an already stored media file for key, or claim key for the caller.
+
+        A caller that gets None owns the key and must call release_media() once
+        its clip is stored (or has failed), so duplicates waiting on it resume.
+        """
+        if key is None:
+            return None
+        while key in self._inflight:
+            filename = await asyncio.shield(self._inflight[key])
+            if filename:
+                self.metrics.increment("clips_deduplicated")
+                return filename
+
+        filename = self._run_media.get(key)
+        if filename:
+            self.metrics.increment("clips_deduplicated")
+            return filename
+
+        filename = self.cache.get_media(self._media_key(key)) if self.cache is not None else None
+        if filename:
+            exists = await self._media_in_anki(filename)
+            if exists:
+                return filename
+            if exists is not None:
+                self.logger.debug("Cached media %s missing from Anki, regenerating", filename)
+                self.cache.forget_media(self._media_key(key))
+
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def release_media(self, key: Optional[str], filename: Optional[str]):
+        if key is None:
+            return
+        if filename:
+            self._run_media[key] = filename
+        if filename and not self.dry_run and self.cache is not None:
+            self.cache.set_media(self._media_key(key), filename)
+            self._verified_media.add(filename)
+        future = self._inflight.pop(key, None)
+        if future and not future.done():
+            future.set_result(filename)
+
+    def cached_audio(self, text: str, key: Optional[str]) -> Optional[bytes]:
+        if key is None or self.cache is None:
+            return None
+        audio = self.cache.get(key)
+        if audio:
+            self.logger.debug("Cache hit for text: %.50s...", text)
+        return audio
+
+    async def audio_query(self, text: str, style_id: Optional[int] = None) -> Optional[dict]:
+        """Create (or load) the AudioQuery for text; None leaves it to synthesize() and its retries."""
+        try:
+            with self.metrics.track("audio_query"):
+                return await self.voicevox.create_audio_query(text, style_id)
+        except Exception as e:
+            self.logger.warning(f"Audio query failed for text '{text}', retrying at synthesis: {e}")
+            return None
+
+    async def synthesize(self, text: str, key: Optional[str], audio_query: Optional[dict] = None,
+                         style_id: Optional[int] = None) -> Optional[bytes]:
+        with self.metrics.track("generate_audio"):
+            if self.synth_batcher is not None:
+                audio = await self.synth_batcher.generate_audio(text, audio_query, style_id)
+            else:
+                audio = await self.voicevox.generate_audio(text, audio_query, style_id)
+        if not audio:
+            self.metrics.increment("synthesis_failures")
+        if audio and key is not None and self.cache is not None:
+            self.cache.put(key, audio)
+        return audio
+
+    def _add_total(self, found: int, limit: Optional[int] = None):
+        self.notes_total = (self.notes_total or 0) + (min(found, limit) if limit else found)
+
+    def progress(self) -> Dict[str, object]:
+        """Snapshot of the running batch: notes done out of total, and per-stage queue depths."""
+        pipeline = self.pipeline
+        return {
+            "total": self.notes_total,
+            "done": pipeline.completed if pipeline is not None else self.notes_done,
+            "queues": pipeline.queue_depths() if pipeline is not None else {},
+        }
+
+    def report_metrics(self):
+        """Log per-stage timings and write them out if an export path is configured."""
+        summary = self.metrics.summary()
+        self.logger.info(f"Run metrics: {summary['elapsed_s']}s, {summary['counters']}")
+        for name, stage in summary["stages"].items():
+            self.logger.info(f"  {name}: {stage}")
+        try:
+            if self.metrics_json:
+                self.metrics.write_json(self.metrics_json)
+                self.logger.info(f"Wrote metrics summary to {self.metrics_json}")
+            if self.metrics_prometheus:
+                self.metrics.write_prometheus(self.metrics_prometheus)
+                self.logger.info(f"Wrote Prometheus metrics to {self.metrics_prometheus}")
+        except OSError as e:
+            self.logger.error(f"Failed to write metrics: {e}")
+
+    async def process_note(self, note: Dict, job: Optional[DeckJob] = None):
+        note_id = note["noteId"]
+
+        updates = {}
+        for audio_field, prefix, text, style_id in self.note_jobs(note, job):
+            saved_filename = await self.resumed_media(note_id, audio_field, text, style_id)
+            if saved_filename:
+                updates[audio_field] = f"[sound:{saved_filename}]"
+                continue
+
+            key = self.text_key(text, style_id)
+            saved_filename = await self.claim_media(key)
+            if saved_filename is None:
+                try:
+                    audio = self.cached_audio(text, key) or await self.synthesize(text, key, style_id=style_id)
+                    if audio:
+                        self.journal_record(note_id, audio_field, text, SYNTHESIZED, style_id=style_id)
+                        filename = self.media_filename(prefix, note_id, key)
+                        if not self.dry_run:
+                            mp3_data = await self.encoder.encode(audio)
+                            saved_filename = await self.anki_async.upload_mp3(mp3_data, filename)
+                        else:
+                            saved_filename = f"{filename}.mp3 (dry-run)"
+                except Exception as e:
+                    self.logger.error(f"Failed to store audio for note {note_id} ({audio_field}): {e}")
+                finally:
+                    self.release_media(key, saved_filename)
+            if saved_filename:
                 if not self.dry_run:
-                    saved_filename = self.anki.store_audio(audio, filename)
-                else:
-                    saved_filename = f"{filename}.mp3 (dry-run)"
-                if saved_filename:
-                    updates[self.term_audio_field] = f"[sound:{saved_filename}]"
+                    self.journal_record(note_id, audio_field, text, STORED, saved_filename, style_id)
+                updates[audio_field] = f"[sound:{saved_filename}]"
 
         if updates:
-            try:
-                if not self.dry_run:
-                    self.anki.invoke("updateNoteFields", note={"id": note_id, "fields": updates})
-                self.logger.info(f"{'[DRY-RUN] ' if self.dry_run else ''}Updated note {note_id}: {updates}")
-                self.dry_run_updates.append((note_id, updates))
-            except Exception as e:
-                self.logger.error(f"Failed to update note {note_id}: {e}")
-
-    async def batch_process_deck(self, deck_name: str):
-        notes = self.anki.get_deck_notes(deck_name)
-        if self.limit:
-            notes = notes[:self.limit]
-        self.logger.info(f"Processing {len(notes)} notes in deck {deck_name}...")
+            await self.apply_updates(note_id, updates)
+
+    async def batch_process_deck(self, deck_name: str, since: Optional[float] = None) -> int:
+        """Process notes missing audio, or only those changed after `since`; returns the note count."""
+        return await self.process_jobs([self.deck_job(deck_name)], since=since)
+
+    async def _check_job_styles(self, jobs: List[DeckJob]) -> List[DeckJob]:
+        """Drop jobs whose style ID the engine does not offer."""
+        if all(job.style_id is None for job in jobs):
+            return jobs
+        styles = await self.voicevox.style_names()
+        if any(job.style_id is not None and job.style_id not in styles for job in jobs):
+            # The cached speaker list may predate a newly installed voice
+            styles = await self.voicevox.style_names(refresh=True)
+        valid = []
+        for job in jobs:
+            if job.style_id is not None and job.style_id not in styles:
+                self.logger.error(f"Skipping deck {job.deck}: VOICEVOX has no style_id {job.style_id}")
+                continue
+            if job.style_id is not None:
+                self.logger.info(f"Deck {job.deck} uses style_id {job.style_id}: {styles[job.style_id]}")
+            valid.append(job)
+        return valid
+
+    async def _job_notes(self, jobs: List[DeckJob], since: Optional[float] = None):
+        """Yield (job, note) pairs from every deck, interleaved by job weight.
+
+        A note whose cards sit in several listed decks is processed once, with
+        the first job that yields it.
+        """
+        sources = [(job.weight, self._deck_notes(job, since)) for job in jobs]
+        seen = set()
+        async for job, note in interleave(sources):
+            if note["noteId"] in seen:
+                continue
+            seen.add(note["noteId"])
+            yield job, note
+
+    async def _deck_notes(self, job: DeckJob, since: Optional[float] = None):
+        notes = self.anki_async.iter_deck_notes(job.deck, chunk_size=self.fetch_chunk_size, limit=job.limit,
+                                                field_pairs=job.field_pairs, since=since,
+                                                on_found=lambda found: self._add_total(found, job.limit))
+        try:
+            async for note in notes:
+                yield job, note
+        except Exception as e:
+            # Other decks keep going; the caller sees the failure in fetch_errors
+            self.logger.error(f"Failed to retrieve notes from deck {job.deck}: {e}")
+            self.fetch_errors.append(f"{job.deck}: {e}")
+
+    async def process_jobs(self, jobs: List[DeckJob], since: Optional[float] = None) -> int:
+        """Process several decks through one shared pipeline; returns the note count.
+
+        Notes from all decks are interleaved fairly, and identical (text, style)
+        clips are synthesized once and linked from every deck that needs them.
+        """
+        # Incremental polls log at debug level so an idle daemon stays quiet
+        log = self.logger.info if since is None else self.logger.debug
+        jobs = await self._check_job_styles(jobs)
+        if not jobs:
+            return 0
+        if len(jobs) == 1:
+            log(f"Processing notes in deck {jobs[0].deck}...")
+        else:
+            log(f"Processing {len(jobs)} decks: {', '.join(job.deck for job in jobs)}")
+        notes = self._job_notes(jobs, since)
+        self.voicevox.query_cache = self.query_cache
         self.dry_run_updates = []
-        for i, note in enumerate(notes, 1):
-            await self.process_note(note)
-            self.logger.debug(f"Processed note {i}/{len(notes)}")
-        self.logger.info("Batch processing complete.")
+        self.metrics.reset()
+        self.notes_total = None
+        self.notes_done = 0
+        self.fetch_errors = []
+        self._run_media = {}
+        processed = 0
+        try:
+            if self.workers > 1:
+                log(f"Running concurrent pipeline with {self.workers} workers per stage")
+                if self.anki_batch_size > 1 and not self.dry_run:
+                    self.batcher = AnkiBatcher(self.anki_async, self.logger, batch_size=self.anki_batch_size,
+                                               flush_interval=self.anki_flush_interval)
+                if self.synth_batch_size > 1:
+                    self.synth_batcher = SynthesisBatcher(self.voicevox, self.logger, batch_size=self.synth_batch_size,
+                                                          max_delay=self.synth_batch_delay)
+                self.pipeline = NotePipeline(self, workers=self.workers)
+                await self.pipeline.run(notes)
+                processed = self.pipeline.total
+            else:
+                async for job, note in notes:
+                    await self.process_note(note, job)
+                    processed += 1
+                    self.notes_done = processed
+                    self.logger.debug("Processed note %d", processed)
+        finally:
+            if self.pipeline is not None:
+                self.notes_done = self.pipeline.completed
+            self.pipeline = None
+            if self.synth_batcher is not None:
+                await self.synth_batcher.close()
+                self.synth_batcher = None
+            if self.batcher is not None:
+                await self.batcher.close()
+                self.batcher = None
+            # Drop claims left behind by an aborted run so the next one does not wait on them
+            for key in list(self._inflight):
+                self.release_media(key, None)
+        if since is not None and not processed:
+            # Incremental polls that found nothing stay quiet
+            return 0
+        self.logger.info(f"Batch processing complete: {processed} notes.")
+        self.metrics.increment("notes", processed)
+        self.report_metrics()
+        if self.cache is not None:
+            self.logger.info(f"Synthesis cache: {self.cache.stats()}")
+        if self.query_cache is not None:
+            self.logger.info(f"Audio query cache: {self.query_cache.stats()}")
+        if self.journal is not None:
+            self.logger.info(f"Run journal: {self.journal.stats()}")
+        if self.voicevox.limiter is not None:
+            self.logger.info(f"VOICEVOX concurrency: {self.voicevox.limiter.stats()}")
+        if len(self.voicevox.engines.endpoints) > 1:
+            for url, stats in self.voicevox.engines.stats().items():
+                self.logger.info(f"VOICEVOX engine {url}: {stats}")
         if self.dry_run and self.dry_run_updates:
             self.logger.info("Dry run summary:")
             for note_id, updates in self.dry_run_updates:
-                self.logger.info(f"  Note {note_id}: {updates}")
\ No newline at end of file
+                self.logger.info(f"  Note {note_id}: {updates}")
+        return processed
@@ -0,0 +1,115 @@
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Dict, Optional
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 10.0) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    """AIMD limit on the number of in-flight requests to a server.
+
+    Each successful request whose latency stays in line with the recent
+    trend raises the limit by 1/limit (about +1 per round trip). An error,
+    or short-term latency rising past `tolerance` times the long-term
+    average, cuts the limit by `decrease_ratio`, at most once per `cooldown`
+    seconds. Latency is tracked per request kind, since an audio query and
+    a synthesis call take very different times.
+
+    With `metrics`, the limit and in-flight count are kept up to date as
+    `<name>_concurrency_limit` and `<name>_in_flight` gauges.
+    """
+
+    def __init__(self, logger, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 tolerance: float = 2.0, decrease_ratio: float = 0.7, cooldown: float = 1.0,
+                 metrics=None, name: str = "voicevox"):
+        self.logger = logger
+        self.metrics = metrics
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.decrease_ratio = decrease_ratio
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._short: Dict[str, float] = {}
+        self._long: Dict[str, float] = {}
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._publish()
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                elif not future.cancelled():
+                    # We were handed a slot but will not use it; pass it on
+                    self._wake()
+                raise
+        self.in_flight += 1
+        self._publish()
+
+    def release(self, latency: float, ok: bool, kind: str = ""):
+        self.in_flight -= 1
+        if ok and not self._latency_rising(kind, latency):
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+        else:
+            self._decrease("error" if not ok else f"{kind} latency rising")
+        self._publish()
+        self._wake()
+
+    def abandon(self):
+        """Free the slot of a cancelled request without adjusting the limit."""
+        self.in_flight -= 1
+        self._publish()
+        self._wake()
+
+    def _latency_rising(self, kind: str, latency: float) -> bool:
+        short = self._short.get(kind, latency) * 0.7 + latency * 0.3
+        long = self._long.get(kind, latency) * 0.98 + latency * 0.02
+        self._short[kind], self._long[kind] = short, long
+        return short > long * self.tolerance
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_ratio)
+        self.decreases += 1
+        self.logger.debug("Concurrency limit %.1f -> %.1f (%s)", previous, self.limit, reason)
+
+    def _publish(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge(f"{self.name}_concurrency_limit", round(self.limit, 2))
+            self.metrics.set_gauge(f"{self.name}_in_flight", self.in_flight)
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                free -= 1
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
@@ -0,0 +1,113 @@
+import time
+import asyncio
+from typing import Dict, Optional
+from aiohttp import web
+
+
+class AudioDaemon:
+    """Keeps one AudioProcessor warm and processes a deck incrementally.
+
+    Speaker discovery, pooled connections, the encoder pool and the caches are
+    set up once. Each poll only asks AnkiConnect for notes added or edited
+    since the previous poll; a full scan of the deck runs at start-up and every
+    `full_scan_interval` seconds to pick up notes that failed earlier.
+
+    With a control port, a local HTTP endpoint serves `GET /status` (state,
+    progress and queue depths, last poll, metrics) and `POST /poll` (poll now).
+    """
+
+    def __init__(self, processor, deck_name: str, logger, poll_interval: float = 30.0,
+                 full_scan_interval: float = 3600.0, control_host: str = "127.0.0.1",
+                 control_port: Optional[int] = 8766):
+        self.processor = processor
+        self.deck_name = deck_name
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self.full_scan_interval = full_scan_interval
+        self.control_host = control_host
+        self.control_port = control_port
+        self.state = "starting"
+        self.started = time.time()
+        self.polls = 0
+        self.notes_processed = 0
+        self.last_poll: Optional[float] = None
+        self.last_poll_notes = 0
+        self.last_full_scan: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+
+    async def run(self):
+        try:
+            await self.processor.initialize()
+            await self._start_control()
+            self.logger.info(f"Watching deck {self.deck_name} every {self.poll_interval:g}s")
+            while True:
+                await self.poll()
+                self.state = "idle"
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            self.state = "stopped"
+            if self._runner is not None:
+                await self._runner.cleanup()
+            await self.processor.close()
+
+    async def poll(self):
+        started = time.time()
+        full_scan = self.last_full_scan is None or started - self.last_full_scan >= self.full_scan_interval
+        # Overlap the previous poll slightly so edits made while it ran are not missed
+        since = None if full_scan else self.last_poll - 5
+        self.state = "scanning" if full_scan else "polling"
+        try:
+            processed = await self.processor.batch_process_deck(self.deck_name, since=since)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.logger.error(f"Poll of deck {self.deck_name} failed: {e}")
+            return
+        self.notes_processed += processed
+        if self.processor.fetch_errors:
+            # Notes that were never fetched must be seen by the next poll, so keep last_poll
+            self.last_error = f"Could not fetch notes: {'; '.join(self.processor.fetch_errors)}"
+            return
+        self.polls += 1
+        self.last_poll = started
+        self.last_poll_notes = processed
+        if full_scan:
+            self.last_full_scan = started
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "deck": self.deck_name,
+            "uptime_s": round(time.time() - self.started, 1),
+            "polls": self.polls,
+            "last_poll": self.last_poll,
+            "last_poll_notes": self.last_poll_notes,
+            "last_full_scan": self.last_full_scan,
+            "notes_processed": self.notes_processed,
+            "last_error": self.last_error,
+            "progress": self.processor.progress(),
+            "cache": self.processor.cache.stats() if self.processor.cache is not None else None,
+            "metrics": self.processor.metrics.summary(),
+        }
+
+    async def _start_control(self):
+        if not self.control_port:
+            return
+        app = web.Application()
+        app.add_routes([web.get("/status", self._handle_status), web.post("/poll", self._handle_poll)])
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.control_host, self.control_port).start()
+        self.logger.info(f"Control endpoint on http://{self.control_host}:{self.control_port}/status")
+
+    async def _handle_status(self, request):
+        return web.json_response(self.status())
+
+    async def _handle_poll(self, request):
+        self._wakeup.set()
+        return web.json_response({"state": self.state, "poll": "scheduled"})
@@ -0,0 +1,65 @@
+import os
+import asyncio
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, TYPE_CHECKING
+from .metrics import Metrics
+
+if TYPE_CHECKING:
+    from .postprocess import AudioPostProcessor
+
+
+def encode_mp3(wav_data: bytes, bitrate: str = "64k", postprocessor: Optional["AudioPostProcessor"] = None) -> bytes:
+    """Encode WAV bytes to MP3 bytes by piping them through ffmpeg.
+
+    Nothing touches the filesystem: the WAV goes in on stdin and the MP3 is
+    read back from stdout. A postprocessor trims/normalizes the clip first,
+    in the same worker process.
+    """
+    # Imported here so only encoder processes pay for pydub
+    from pydub.utils import get_encoder_name
+
+    if postprocessor is not None:
+        wav_data = postprocessor.process(wav_data)
+    command = [
+        get_encoder_name(), "-hide_banner", "-loglevel", "error",
+        "-f", "wav", "-i", "pipe:0",
+        "-f", "mp3", "-b:a", bitrate, "pipe:1",
+    ]
+    result = subprocess.run(command, input=wav_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+    if not result.stdout:
+        raise RuntimeError("ffmpeg produced no MP3 output")
+    return result.stdout
+
+
+class Mp3Encoder:
+    """Encodes clips on a process pool so CPU-bound MP3 work never blocks the event loop."""
+
+    def __init__(self, logger, max_workers: Optional[int] = None, bitrate: str = "64k",
+                 metrics: Optional[Metrics] = None, postprocessor: Optional["AudioPostProcessor"] = None):
+        self.logger = logger
+        self.metrics = metrics or Metrics()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.bitrate = bitrate
+        self.postprocessor = postprocessor
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self.logger.debug(f"Started MP3 encoder pool with {self.max_workers} processes")
+        return self._pool
+
+    async def encode(self, wav_data: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        with self.metrics.track("encode"):
+            return await loop.run_in_executor(self._get_pool(), encode_mp3, wav_data, self.bitrate,
+                                              self.postprocessor)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self.logger.debug("Stopped MP3 encoder pool")
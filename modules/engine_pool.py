@@ -0,0 +1,87 @@
+from typing import Dict, List, Optional
+
+
+class Endpoint:
+    """One VOICEVOX engine and its request statistics."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.ewma_latency: Optional[float] = None
+
+    def stats(self) -> Dict[str, object]:
+        completed = self.requests - self.failures
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "avg_ms": round(self.total_latency / completed * 1000, 1) if completed else None,
+            "ewma_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "max_ms": round(self.max_latency * 1000, 1),
+        }
+
+
+class EnginePool:
+    """Spreads requests over several VOICEVOX engines by least outstanding requests.
+
+    An endpoint leaves the rotation after `max_failures` consecutive failures
+    and comes back once a health check (see VoiceVoxClient) succeeds again.
+    """
+
+    def __init__(self, urls: List[str], logger, max_failures: int = 3):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.logger = logger
+        self.max_failures = max_failures
+        self._next = 0
+
+    def acquire(self) -> Endpoint:
+        candidates = [e for e in self.endpoints if e.healthy] or self.endpoints
+        # Rotate the starting point so ties do not always land on the first engine
+        self._next = (self._next + 1) % len(candidates)
+        ordered = candidates[self._next:] + candidates[:self._next]
+        endpoint = min(ordered, key=lambda e: e.outstanding)
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def release(self, endpoint: Endpoint, latency: float, ok: Optional[bool]):
+        """Record a finished request; ok=None means it was abandoned (cancelled) and says nothing about health."""
+        endpoint.outstanding -= 1
+        if ok is None:
+            endpoint.requests -= 1
+            return
+        if ok:
+            endpoint.consecutive_failures = 0
+            endpoint.total_latency += latency
+            endpoint.max_latency = max(endpoint.max_latency, latency)
+            if endpoint.ewma_latency is None:
+                endpoint.ewma_latency = latency
+            else:
+                endpoint.ewma_latency = 0.8 * endpoint.ewma_latency + 0.2 * latency
+            return
+
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.healthy and endpoint.consecutive_failures >= self.max_failures:
+            self.mark(endpoint, healthy=False)
+
+    def mark(self, endpoint: Endpoint, healthy: bool):
+        if endpoint.healthy == healthy:
+            return
+        endpoint.healthy = healthy
+        if healthy:
+            endpoint.consecutive_failures = 0
+            self.logger.info(f"VOICEVOX engine {endpoint.url} is back in rotation")
+        else:
+            self.logger.warning(f"VOICEVOX engine {endpoint.url} taken out of rotation after "
+                                f"{endpoint.consecutive_failures} failures")
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {e.url: e.stats() for e in self.endpoints}
@@ -1,21 +1,38 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
+import time
 import asyncio
 import threading
-from typing import Optional
+from typing import Callable, Optional
 from .audio_processor import AudioProcessor
 import logging
 import queue
+from collections import deque
 import sys
 from io import StringIO
 
 class TextHandler(logging.Handler):
-    def __init__(self, text_widget, notebook):
+    """Log handler rendering into a Tk Text widget without slowing either thread down.
+
+    emit() only appends the record to a bounded deque. Every poll the Tk
+    thread formats the pending records that pass the level filter and adds
+    them with a single insert() call, then trims the widget to `max_lines`.
+    The last `max_lines` records are kept so the level filter can be changed
+    on the fly.
+    """
+
+    def __init__(self, text_widget, notebook, max_lines: int = 5000, poll_ms: int = 100):
         super().__init__()
         self.text_widget = text_widget
         self.notebook = notebook
-        self.queue = queue.Queue()
-        self.text_widget.after(100, self.poll_queue)
+        self.max_lines = max_lines
+        self.poll_ms = poll_ms
+        self.display_level = logging.DEBUG
+        # Ring buffers: when the UI falls behind, the oldest lines are dropped first
+        self.pending = deque(maxlen=max_lines)
+        self.history = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.text_widget.after(poll_ms, self.poll_queue)
         
         # Configure text widget tags for different log levels
         self.text_widget.tag_configure('DEBUG', foreground='#666666')  # Màu xám nhạt
@@ -25,31 +42,72 @@ class TextHandler(logging.Handler):
         self.text_widget.tag_configure('CRITICAL', foreground='#C62828', underline=1)  # Màu đỏ đậm + gạch chân
 
     def emit(self, record):
-        msg = self.format(record)
-        self.queue.put((msg, record.levelname))
+        # Formatting is left to the Tk thread, and skipped for filtered-out records
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(record)
+
+    def set_display_level(self, level: int):
+        self.display_level = level
+        self.text_widget.delete('1.0', tk.END)
+        self._render(list(self.history))
 
     def poll_queue(self):
-        try:
-            while True:
-                msg, level = self.queue.get_nowait()
-                self.text_widget.insert(tk.END, msg + '\n', level)
-                self.text_widget.see(tk.END)
-        except queue.Empty:
-            pass
-        self.text_widget.after(100, self.poll_queue)
+        records = []
+        while self.pending:
+            records.append(self.pending.popleft())
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            # Say so rather than leave a silent gap in the log
+            self.text_widget.insert(tk.END, f"... {dropped} log lines dropped ...\n", 'WARNING')
+        if records:
+            self.history.extend(records)
+            self._render(records)
+        self.text_widget.after(self.poll_ms, self.poll_queue)
+
+    def _render(self, records):
+        chunks = []
+        for record in records:
+            if record.levelno >= self.display_level:
+                chunks += [self.format(record) + '\n', record.levelname]
+        if not chunks:
+            return
+        # Only follow the end if the user has not scrolled up to read something
+        at_bottom = self.text_widget.yview()[1] >= 0.999
+        self.text_widget.insert(tk.END, *chunks)
+        lines = int(self.text_widget.index('end-1c').split('.')[0])
+        if lines > self.max_lines:
+            self.text_widget.delete('1.0', f'{lines - self.max_lines + 1}.0')
+        if at_bottom:
+            self.text_widget.see(tk.END)
 
 class VoiceVoxAnkiGUI:
-    def __init__(self, processor: AudioProcessor):
+    def __init__(self, processor: AudioProcessor, log_lines: int = 5000):
         self.processor = processor
+        self.log_lines = log_lines
         self.root = tk.Tk()
         self.root.title("VoiceVox Anki")
-        self.root.geometry("600x500")
-    
+        self.root.geometry("600x560")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Create main frame with padding
         self.main_frame = ttk.Frame(self.root, padding="10")
         self.main_frame.pack(fill=tk.BOTH, expand=True)
-        
+
+        # One event loop thread runs every processing job; Tk stays on the main thread
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.loop_thread.start()
+        # Only touched on the loop thread
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.current: Optional[AudioProcessor] = None
+        self.run_started = 0.0
+        # Callbacks from the loop thread, run on the Tk thread by poll_ui_queue()
+        self.ui_queue = queue.Queue()
+
         self.setup_gui()
+        self.root.after(100, self.poll_ui_queue)
 
     def create_tooltip(self, widget, text):
         def show_tooltip(event):
@@ -138,23 +196,49 @@ class VoiceVoxAnkiGUI:
         self.style_entry.grid(row=1, column=1, sticky=tk.W, pady=2)
         self.create_tooltip(self.style_entry, "VOICEVOX style ID (optional, default: 0 - あまあま)")
 
+        # Workers
+        ttk.Label(options_frame, text="Workers:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.workers_entry = ttk.Entry(options_frame, width=10)
+        self.workers_entry.insert(0, "1")
+        self.workers_entry.grid(row=2, column=1, sticky=tk.W, pady=2)
+        self.create_tooltip(self.workers_entry, "Concurrent workers per pipeline stage (1 = serial)")
+
         # Dry run
         self.dry_run_var = tk.BooleanVar()
-        ttk.Checkbutton(options_frame, text="Dry Run (no changes)", variable=self.dry_run_var).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        ttk.Checkbutton(options_frame, text="Dry Run (no changes)", variable=self.dry_run_var).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=2)
         self.create_tooltip(options_frame, "Simulate processing without making changes to Anki")
 
-        # Process button
-        self.process_button = ttk.Button(main_tab, text="Process Deck", command=self.start_processing)
-        self.process_button.pack(pady=10)
-
-        # Status
+        # Process and cancel buttons
+        buttons_frame = ttk.Frame(main_tab)
+        buttons_frame.pack(pady=10)
+        self.process_button = ttk.Button(buttons_frame, text="Process Deck", command=self.start_processing)
+        self.process_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(buttons_frame, text="Cancel", command=self.cancel_processing, state="disabled")
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        # Progress
+        self.progress_bar = ttk.Progressbar(main_tab, mode="determinate")
+        self.progress_bar.pack(fill=tk.X, padx=5)
         self.status_label = ttk.Label(main_tab, text="Ready")
         self.status_label.pack(pady=5)
+        self.queues_label = ttk.Label(main_tab, text="", foreground="#666666")
+        self.queues_label.pack()
 
         # Log tab
         log_tab = ttk.Frame(self.notebook)
         self.notebook.add(log_tab, text="Log")
 
+        # Level filter
+        filter_frame = ttk.Frame(log_tab)
+        filter_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
+        ttk.Label(filter_frame, text="Show:").pack(side=tk.LEFT)
+        self.log_level_var = tk.StringVar(value="DEBUG")
+        level_box = ttk.Combobox(filter_frame, textvariable=self.log_level_var, width=10, state="readonly",
+                                 values=["DEBUG", "INFO", "WARNING", "ERROR"])
+        level_box.pack(side=tk.LEFT, padx=5)
+        level_box.bind("<<ComboboxSelected>>",
+                       lambda event: self.text_handler.set_display_level(getattr(logging, self.log_level_var.get())))
+
         # Log text with scrollbar
         log_frame = ttk.Frame(log_tab)
         log_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -167,78 +251,156 @@ class VoiceVoxAnkiGUI:
         scrollbar.config(command=self.log_text.yview)
 
         # Configure logging
-        text_handler = TextHandler(self.log_text, self.notebook)
-        text_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        self.processor.logger.addHandler(text_handler)
+        self.text_handler = TextHandler(self.log_text, self.notebook, max_lines=self.log_lines)
+        self.text_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        self.processor.logger.addHandler(self.text_handler)
 
-    def start_processing(self):
-        self.process_button.config(state="disabled")
-        self.status_label.config(text="Processing...")
-        self.processor.logger.info("Starting...")
-        
-        # Switch to Log tab
-        self.notebook.select(1)  # Select the Log tab (index 1)
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
 
+    def call_in_ui(self, callback: Callable, *args):
+        """Schedule callback on the Tk thread; safe to call from the processing loop."""
+        self.ui_queue.put((callback, args))
+
+    def poll_ui_queue(self):
+        try:
+            while True:
+                callback, args = self.ui_queue.get_nowait()
+                callback(*args)
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_ui_queue)
+
+    def _start_task(self, coro):
+        self.task = self.loop.create_task(coro)
+        self.task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self.task = None
+        self.call_in_ui(self.reset_ui)
+
+    def _cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def start_processing(self):
+        if self.running:
+            return
         deck_name = self.deck_entry.get()
         limit = self.limit_entry.get()
         style_id = self.style_entry.get()
+        workers = self.workers_entry.get()
         dry_run = self.dry_run_var.get()
-        
-        # Get field names
-        sentence_field = self.sentence_field_entry.get()
-        sentence_audio_field = self.sentence_audio_field_entry.get()
-        term_field = self.term_field_entry.get()
-        term_audio_field = self.term_audio_field_entry.get()
 
         try:
             limit = int(limit) if limit.strip() else None
             style_id = int(style_id) if style_id.strip() else None
+            workers = int(workers) if workers.strip() else 1
         except ValueError:
-            messagebox.showerror("Error", "Limit and Style ID must be numbers")
-            self.reset_ui()
+            messagebox.showerror("Error", "Limit, Style ID and Workers must be numbers")
             return
 
-        # Run in thread to avoid blocking GUI
-        threading.Thread(
-            target=self.run_processing,
-            args=(deck_name, limit, style_id, dry_run, sentence_field, sentence_audio_field, term_field, term_audio_field),
-            daemon=True
-        ).start()
+        settings = self.processor.settings(
+            dry_run=dry_run,
+            limit=limit,
+            style_id=style_id,
+            sentence_field=self.sentence_field_entry.get(),
+            sentence_audio_field=self.sentence_audio_field_entry.get(),
+            term_field=self.term_field_entry.get(),
+            term_audio_field=self.term_audio_field_entry.get(),
+            workers=workers
+        )
+
+        self.process_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.status_label.config(text="Processing...")
+        self.progress_bar.config(value=0, maximum=1)
+        self.processor.logger.info("Starting...")
+
+        # Switch to Log tab
+        self.notebook.select(1)  # Select the Log tab (index 1)
+
+        self.running = True
+        self.run_started = time.monotonic()
+        self.loop.call_soon_threadsafe(self._start_task, self.run_processing(deck_name, settings))
+        self.root.after(500, self.update_progress)
 
-    def run_processing(self, deck_name: str, limit: Optional[int], style_id: Optional[int], dry_run: bool,
-                      sentence_field: str, sentence_audio_field: str, term_field: str, term_audio_field: str):
+    async def run_processing(self, deck_name: str, settings: dict):
         try:
-            # Create new processor with GUI settings
-            processor = AudioProcessor(
-                logger=self.processor.logger,
-                dry_run=dry_run,
-                limit=limit,
-                style_id=style_id,
-                sentence_field=sentence_field,
-                sentence_audio_field=sentence_audio_field,
-                term_field=term_field,
-                term_audio_field=term_audio_field
-            )
-
-            if not processor.check_connections():
-                self.processor.logger.error("Error: VOICEVOX or AnkiConnect not running")
-                self.reset_ui()
-                return
-
-            asyncio.run(processor.initialize())
-            asyncio.run(processor.batch_process_deck(deck_name))
+            # Built on the loop thread, which owns its SQLite connections and sessions
+            processor = AudioProcessor(**settings)
+            self.current = processor
+            try:
+                if not await processor.verify_connections():
+                    self.processor.logger.error("Error: VOICEVOX or AnkiConnect not running")
+                    self.call_in_ui(messagebox.showerror, "Error", "VOICEVOX or AnkiConnect not running")
+                    return
+                await processor.run(deck_name)
+            finally:
+                # run() already closed everything unless the connection check failed
+                await processor.close()
             self.processor.logger.info("Processing complete")
-            messagebox.showinfo("Success", "Deck processing complete")
+            self.call_in_ui(messagebox.showinfo, "Success", "Deck processing complete")
+        except asyncio.CancelledError:
+            self.processor.logger.warning("Processing cancelled")
+            raise
         except Exception as e:
             self.processor.logger.error(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"Failed: {str(e)}")
-        finally:
-            self.reset_ui()
+            self.call_in_ui(messagebox.showerror, "Error", f"Failed: {str(e)}")
+
+    def cancel_processing(self):
+        if not self.running:
+            return
+        self.cancel_button.config(state="disabled")
+        self.status_label.config(text="Cancelling...")
+        # In-flight work unwinds through its finally blocks, flushing batchers and
+        # closing sessions; reset_ui() runs once the task has actually finished
+        self.loop.call_soon_threadsafe(self._cancel_task)
+
+    def update_progress(self):
+        if not self.running:
+            return
+        processor = self.current
+        if processor is None:
+            self.root.after(500, self.update_progress)
+            return
+        progress = processor.progress()
+        done, total = progress["done"], progress["total"]
+        elapsed = time.monotonic() - self.run_started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        text = f"{done} notes"
+        if total:
+            self.progress_bar.config(maximum=total, value=done)
+            text = f"{done}/{total} notes"
+            if rate > 0:
+                remaining = int((total - done) / rate)
+                text += f" - ETA {remaining // 60}:{remaining % 60:02d}"
+        if self.cancel_button["state"] != "disabled":
+            self.status_label.config(text=f"{text} - {rate:.1f} notes/sec")
+        self.queues_label.config(text="  ".join(f"{name}: {depth}" for name, depth in progress["queues"].items()))
+        self.root.after(500, self.update_progress)
 
     def reset_ui(self):
         self.process_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
         self.status_label.config(text="Ready")
-        self.root.update()
+        self.queues_label.config(text="")
+        self.current = None
+        self.running = False
+
+    def _shutdown(self):
+        if self.task is None:
+            self.loop.stop()
+            return
+        # Let the cancelled task clean up before the loop stops
+        self.task.add_done_callback(lambda _: self.loop.stop())
+        self.task.cancel()
+
+    def on_close(self):
+        self.loop.call_soon_threadsafe(self._shutdown)
+        self.root.destroy()
+        self.loop_thread.join(timeout=10)
 
     def start(self):
-        self.root.mainloop()
\ No newline at end of file
+        self.root.mainloop()
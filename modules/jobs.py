@@ -0,0 +1,122 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+# Settings a job file may give per deck (or under "defaults" for every deck)
+JOB_KEYS = ("sentence_field", "sentence_audio_field", "term_field", "term_audio_field", "style_id", "limit", "weight")
+
+
+class DeckJob:
+    """One deck to process, with its own field mapping, voice and scheduling weight."""
+
+    def __init__(self, deck: str, sentence_field: str = "Sentence", sentence_audio_field: str = "Sentence Audio",
+                 term_field: str = "Term", term_audio_field: str = "Term Audio", style_id: Optional[int] = None,
+                 limit: Optional[int] = None, weight: int = 1):
+        self.deck = deck
+        self.sentence_field = sentence_field
+        self.sentence_audio_field = sentence_audio_field
+        self.term_field = term_field
+        self.term_audio_field = term_audio_field
+        # None means the processor's own style
+        self.style_id = style_id
+        self.limit = limit
+        self.weight = max(1, weight)
+
+    @property
+    def field_pairs(self):
+        return ((self.sentence_field, self.sentence_audio_field), (self.term_field, self.term_audio_field))
+
+    def __repr__(self):
+        return f"DeckJob({self.deck!r}, style_id={self.style_id}, weight={self.weight})"
+
+
+def load_job_file(path: str, defaults: Optional[Dict] = None) -> List[DeckJob]:
+    """Read a JSON (or, with PyYAML installed, YAML) job file into DeckJobs.
+
+    The file is either a list of decks or a mapping with `decks` and optional
+    `defaults`. Each deck is a name or a mapping with `deck` plus any of
+    JOB_KEYS; missing settings come from `defaults`, then the file's defaults.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yml", ".yaml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML job files need PyYAML (pip install pyyaml); use JSON otherwise")
+            try:
+                data = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(f"Invalid YAML: {e}")
+        else:
+            data = json.load(f)
+
+    if isinstance(data, list):
+        data = {"decks": data}
+    if not isinstance(data, dict) or not isinstance(data.get("decks"), list) or not data["decks"]:
+        raise ValueError(f"Job file {path} must list at least one deck under 'decks'")
+
+    base = dict(defaults or {})
+    file_defaults = data.get("defaults") or {}
+    if not isinstance(file_defaults, dict):
+        raise ValueError(f"Job file {path}: 'defaults' must be a mapping")
+    base.update(_job_settings(file_defaults, "defaults"))
+    jobs = []
+    for entry in data["decks"]:
+        if isinstance(entry, str):
+            entry = {"deck": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("deck"), str) or not entry["deck"].strip():
+            raise ValueError(f"Job file entry {entry!r} has no 'deck'")
+        settings = dict(base)
+        settings.update(_job_settings({k: v for k, v in entry.items() if k != "deck"}, entry["deck"]))
+        jobs.append(DeckJob(entry["deck"], **settings))
+    return jobs
+
+
+def _job_settings(settings: Dict, where: str) -> Dict:
+    """Check a deck's (or the defaults') settings, raising ValueError that names `where`."""
+    unknown = set(settings) - set(JOB_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown job settings for {where}: {', '.join(sorted(unknown))}")
+    for key, value in settings.items():
+        if key.endswith("_field"):
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"{key} for {where} must be a non-empty string, got {value!r}")
+        elif key == "style_id":
+            if value is not None and not _is_int(value):
+                raise ValueError(f"style_id for {where} must be an integer, got {value!r}")
+        elif key == "limit":
+            if value is not None and (not _is_int(value) or value < 1):
+                raise ValueError(f"limit for {where} must be a positive integer, got {value!r}")
+        elif key == "weight":
+            if not _is_int(value) or value < 1:
+                raise ValueError(f"weight for {where} must be a positive integer, got {value!r}")
+    return settings
+
+
+def _is_int(value) -> bool:
+    # bool is an int subclass, but "weight": true is a mistake, not 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+async def interleave(sources: List[tuple]):
+    """Merge (weight, async iterator) sources by weighted round robin.
+
+    Each round takes up to `weight` items from every source that still has
+    some, so a large deck cannot starve a small one and every deck starts
+    making progress right away.
+    """
+    active = [(weight, iterator.__aiter__()) for weight, iterator in sources]
+    while active:
+        remaining = []
+        for weight, iterator in active:
+            exhausted = False
+            for _ in range(weight):
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                yield item
+            if not exhausted:
+                remaining.append((weight, iterator))
+        active = remaining
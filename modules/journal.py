@@ -0,0 +1,57 @@
+import time
+import sqlite3
+from typing import Dict, Iterable, Optional
+
+# Field states, in the order a clip moves through them
+SYNTHESIZED = "synthesized"
+STORED = "stored"
+LINKED = "linked"
+
+
+class RunJournal:
+    """Durable per-field record of batch progress, kept in SQLite.
+
+    Every (note, audio field) pair is recorded as synthesized, stored (with
+    the uploaded media filename) and finally linked once updateNoteFields
+    succeeds. A resumed run uses it to link clips that were uploaded but never
+    attached to their note, without synthesizing or uploading them again.
+    """
+
+    def __init__(self, path: str, logger):
+        self.path = path
+        self.logger = logger
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS fields (
+            note_id INTEGER, field TEXT, text_key TEXT, state TEXT, filename TEXT, updated_at REAL,
+            PRIMARY KEY (note_id, field))""")
+        self._db.commit()
+
+    def lookup(self, note_id: int, field: str, text_key: str) -> Optional[str]:
+        """Return the media filename already uploaded for this field, if the text is unchanged."""
+        row = self._db.execute("SELECT text_key, state, filename FROM fields WHERE note_id = ? AND field = ?",
+                               (note_id, field)).fetchone()
+        if row and row[0] == text_key and row[1] in (STORED, LINKED) and row[2]:
+            return row[2]
+        return None
+
+    def record(self, note_id: int, field: str, text_key: str, state: str, filename: Optional[str] = None):
+        self._db.execute("INSERT OR REPLACE INTO fields (note_id, field, text_key, state, filename, updated_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (note_id, field, text_key, state, filename, time.time()))
+        self._db.commit()
+
+    def mark_linked(self, note_id: int, fields: Iterable[str]):
+        self._db.executemany("UPDATE fields SET state = ?, updated_at = ? WHERE note_id = ? AND field = ?",
+                             [(LINKED, time.time(), note_id, field) for field in fields])
+        self._db.commit()
+
+    def forget(self, note_id: int, field: str):
+        self._db.execute("DELETE FROM fields WHERE note_id = ? AND field = ?", (note_id, field))
+        self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._db.execute("SELECT state, COUNT(*) FROM fields GROUP BY state").fetchall())
+
+    def close(self):
+        self._db.close()
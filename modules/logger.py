@@ -1,17 +1,44 @@
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import sys
 import io
 import os
+import queue
+import atexit
 from datetime import datetime
 
 class UTF8StreamHandler(logging.StreamHandler):
     def __init__(self):
         super().__init__(stream=io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8'))
 
-def setup_logger():
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves %-formatting to the listener thread.
+
+    The stock prepare() formats every record on the calling thread. Our log
+    arguments are immutable (strings and numbers), so the record can travel
+    as is; only exception info has to be rendered before the traceback goes away.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+def setup_logger(level: int = logging.DEBUG, use_queue: bool = True):
+    """Configure the app logger once; later calls return it unchanged.
+
+    With `use_queue`, callers only put records on a queue and a background
+    QueueListener does the file and console I/O, so logging never blocks the
+    event loop. `level` drops records before any work is done (e.g. INFO
+    skips debug messages entirely).
+    """
     logger = logging.getLogger("VoiceVoxAnki")
-    logger.setLevel(logging.DEBUG)
+    if getattr(logger, "_configured", False):
+        logger.setLevel(level)
+        return logger
+    logger.setLevel(level)
+    # Records handled here should not be repeated by root handlers
+    logger.propagate = False
 
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 
@@ -32,7 +59,17 @@ def setup_logger():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        listener.start()
+        # Flush whatever is still queued when the process exits
+        atexit.register(listener.stop)
+        logger.addHandler(DeferredQueueHandler(log_queue))
+        logger._listener = listener
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
 
-    return logger
\ No newline at end of file
+    logger._configured = True
+    return logger
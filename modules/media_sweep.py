@@ -0,0 +1,303 @@
+import os
+import re
+import base64
+import sqlite3
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from .anki_client import AnkiBatcher, _quote_search
+
+# Media this tool creates: content-addressed clips and the older per-note names
+MEDIA_PATTERNS = ("voicevox_*.mp3", "sentence_*.mp3", "term_*.mp3")
+SOUND_TAG = re.compile(r"\[sound:([^\]]+)\]")
+
+
+def hash_file(path: str) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+class MediaIndex:
+    """SQLite record of media hashes, so a sweep only rehashes new or changed files."""
+
+    def __init__(self, path: str, logger):
+        self.path = path
+        self.logger = logger
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS media (
+            filename TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, sha256 TEXT)""")
+        self._db.commit()
+
+    def load(self) -> Dict[str, Tuple[int, Optional[int], str]]:
+        return {row[0]: row[1:] for row in self._db.execute("SELECT filename, size, mtime, sha256 FROM media")}
+
+    def update(self, rows: List[Tuple[str, int, Optional[int], str]]):
+        self._db.executemany("INSERT OR REPLACE INTO media (filename, size, mtime, sha256) VALUES (?, ?, ?, ?)", rows)
+        self._db.commit()
+
+    def remove(self, filenames: List[str]):
+        self._db.executemany("DELETE FROM media WHERE filename = ?", [(name,) for name in filenames])
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class MediaSweeper:
+    """Finds duplicate and unreferenced clips in Anki's media folder and cleans them up.
+
+    Files matching MEDIA_PATTERNS are listed with getMediaFilesNames and
+    hashed in parallel, reading them straight from the media folder when it is
+    reachable (retrieveMediaFile otherwise). Hashes are kept in a MediaIndex,
+    so later sweeps only hash files that are new or changed. Notes pointing at
+    a duplicate are relinked to one canonical copy; files no note references
+    are reported, and deleted with `delete`. With `dry_run` nothing changes.
+    """
+
+    def __init__(self, processor, logger, index_path: str = "media_index.sqlite3", delete: bool = False,
+                 workers: int = 8, patterns=MEDIA_PATTERNS):
+        self.processor = processor
+        self.anki = processor.anki_async
+        self.logger = logger
+        self.index = MediaIndex(index_path, logger)
+        self.delete = delete
+        self.dry_run = processor.dry_run
+        self.workers = max(1, workers)
+        self.patterns = patterns
+        self.chunk_size = processor.fetch_chunk_size
+        self.batcher: Optional[AnkiBatcher] = None
+        self._sizes: Dict[str, int] = {}
+        self._field_values: Dict[Tuple[int, str], str] = {}
+
+    async def run(self) -> Dict[str, int]:
+        try:
+            return await self.sweep()
+        finally:
+            self.index.close()
+            await self.processor.close()
+
+    async def sweep(self) -> Dict[str, int]:
+        names = await self.list_media()
+        self.logger.info(f"Found {len(names)} VOICEVOX clips in the media folder")
+        hashes, hashed = await self.hash_media(names)
+        references = await self.find_references()
+
+        duplicates = self.find_duplicates(hashes, references)
+        relinks = self.plan_relinks(duplicates, references)
+        report = {
+            "media": len(names), "hashed": hashed, "duplicate_groups": len(duplicates),
+            "duplicates": sum(len(copies) for copies in duplicates.values()), "notes_to_relink": len(relinks),
+            "orphans": 0, "orphan_bytes": 0, "relinked": 0, "deleted": 0,
+        }
+        if self.dry_run:
+            orphans = self.find_orphans(hashes, references, duplicates, set(relinks))
+            report.update(orphans=len(orphans), orphan_bytes=sum(self._sizes.get(name, 0) for name in orphans))
+            self.logger.info(f"[DRY-RUN] Media sweep: {report}")
+            for name in orphans[:20]:
+                self.logger.info(f"[DRY-RUN]   orphan: {name}")
+            return report
+
+        self.batcher = AnkiBatcher(self.anki, self.logger, batch_size=self.processor.anki_batch_size,
+                                   flush_interval=self.processor.anki_flush_interval)
+        try:
+            relinked = await self.relink(relinks)
+            report["relinked"] = len(relinked)
+            # Only notes that were actually relinked stop referencing a duplicate
+            orphans = self.find_orphans(hashes, references, duplicates, relinked)
+            report.update(orphans=len(orphans), orphan_bytes=sum(self._sizes.get(name, 0) for name in orphans))
+            if self.delete and orphans:
+                report["deleted"] = await self.delete_media(orphans)
+        finally:
+            await self.batcher.close()
+            self.batcher = None
+        self.logger.info(f"Media sweep: {report}")
+        if orphans and not self.delete:
+            self.logger.info(f"{len(orphans)} unreferenced clips kept; rerun with --delete-orphans to remove them")
+        return report
+
+    async def list_media(self) -> List[str]:
+        names = set()
+        for pattern in self.patterns:
+            names.update(await self.anki.invoke("getMediaFilesNames", pattern=pattern) or [])
+        return sorted(names)
+
+    async def hash_media(self, names: List[str]) -> Tuple[Dict[str, str], int]:
+        """Return ({filename: sha256}, number of files hashed this time)."""
+        known = self.index.load()
+        listed = set(names)
+        gone = [name for name in known if name not in listed]
+        if gone:
+            self.index.remove(gone)
+        try:
+            media_dir = await self.anki.invoke("getMediaDirPath")
+        except Exception:
+            media_dir = None
+        if media_dir and not os.path.isdir(media_dir):
+            # Anki runs on another machine; fetch the files through AnkiConnect instead
+            media_dir = None
+
+        loop = asyncio.get_running_loop()
+        self._sizes = {}
+        hashes: Dict[str, str] = {}
+        stale = []
+        if media_dir:
+            stats = await loop.run_in_executor(None, self._stat_all, media_dir, names)
+            for name, (size, mtime) in stats.items():
+                entry = known.get(name)
+                self._sizes[name] = size
+                if entry and entry[0] == size and entry[1] == mtime:
+                    hashes[name] = entry[2]
+                else:
+                    stale.append(name)
+        else:
+            for name in names:
+                entry = known.get(name)
+                if entry:
+                    self._sizes[name] = entry[0]
+                    hashes[name] = entry[2]
+                else:
+                    stale.append(name)
+        if not stale:
+            return hashes, 0
+
+        self.logger.info(f"Hashing {len(stale)} new or changed clips with {self.workers} workers")
+        rows = []
+        if media_dir:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                # hashlib releases the GIL on large reads, so threads hash in parallel
+                results = await asyncio.gather(*(loop.run_in_executor(pool, hash_file, os.path.join(media_dir, name))
+                                                 for name in stale), return_exceptions=True)
+            for name, result in zip(stale, results):
+                if isinstance(result, Exception):
+                    self.logger.warning(f"Could not hash {name}: {result}")
+                    continue
+                digest, size = result
+                hashes[name] = digest
+                rows.append((name, size, stats[name][1], digest))
+        else:
+            semaphore = asyncio.Semaphore(self.workers)
+
+            async def fetch(name):
+                async with semaphore:
+                    data = base64.b64decode(await self.anki.invoke("retrieveMediaFile", filename=name) or "")
+                return hashlib.sha256(data).hexdigest(), len(data)
+
+            results = await asyncio.gather(*(fetch(name) for name in stale), return_exceptions=True)
+            for name, result in zip(stale, results):
+                if isinstance(result, Exception):
+                    self.logger.warning(f"Could not hash {name}: {result}")
+                    continue
+                digest, size = result
+                hashes[name] = digest
+                self._sizes[name] = size
+                rows.append((name, size, None, digest))
+        self.index.update(rows)
+        return hashes, len(rows)
+
+    @staticmethod
+    def _stat_all(media_dir: str, names: List[str]) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(media_dir, name))
+            except OSError:
+                continue
+            stats[name] = (stat.st_size, stat.st_mtime_ns)
+        return stats
+
+    async def find_references(self) -> Dict[str, List[Tuple[int, str]]]:
+        """Map each clip name to the (note ID, field) pairs whose [sound:] tags point at it."""
+        prefixes = sorted({pattern.split("*")[0] for pattern in self.patterns})
+        query = " OR ".join(f'"[sound\\:{_quote_search(prefix)}"' for prefix in prefixes)
+        note_ids = await self.anki.invoke("findNotes", query=query) or []
+        self.logger.info(f"Scanning {len(note_ids)} notes with sound tags")
+        references: Dict[str, List[Tuple[int, str]]] = {}
+        self._field_values = {}
+        for start in range(0, len(note_ids), self.chunk_size):
+            notes = await self.anki.invoke("notesInfo", notes=note_ids[start:start + self.chunk_size])
+            for note in notes or []:
+                for field, content in note["fields"].items():
+                    value = content.get("value", "")
+                    tags = SOUND_TAG.findall(value)
+                    if not tags:
+                        continue
+                    self._field_values[(note["noteId"], field)] = value
+                    for name in tags:
+                        references.setdefault(name, []).append((note["noteId"], field))
+        return references
+
+    def find_duplicates(self, hashes: Dict[str, str], references) -> Dict[str, List[str]]:
+        """Return {canonical name: [identical copies]} for clips stored more than once."""
+        groups: Dict[str, List[str]] = {}
+        for name, digest in hashes.items():
+            groups.setdefault(digest, []).append(name)
+        duplicates = {}
+        for names in groups.values():
+            if len(names) < 2:
+                continue
+            # Keep the most linked copy, preferring content-addressed names
+            names.sort(key=lambda name: (-len(references.get(name, ())), not name.startswith("voicevox_"), name))
+            duplicates[names[0]] = names[1:]
+        return duplicates
+
+    def plan_relinks(self, duplicates: Dict[str, List[str]], references) -> Dict[int, Dict[str, str]]:
+        """Return {note ID: {field: new value}} pointing every duplicate's notes at its canonical copy."""
+        relinks: Dict[int, Dict[str, str]] = {}
+        for canonical, copies in duplicates.items():
+            for name in copies:
+                for note_id, field in references.get(name, ()):
+                    fields = relinks.setdefault(note_id, {})
+                    value = fields.get(field, self._field_values[(note_id, field)])
+                    fields[field] = value.replace(f"[sound:{name}]", f"[sound:{canonical}]")
+        return relinks
+
+    @staticmethod
+    def find_orphans(hashes: Dict[str, str], references, duplicates: Dict[str, List[str]], relinked) -> List[str]:
+        """Clips no note links to, counting duplicates whose notes now point at the canonical copy."""
+        moved = {name for copies in duplicates.values() for name in copies}
+        orphans = []
+        for name in hashes:
+            linked = references.get(name, ())
+            if name in moved:
+                linked = [ref for ref in linked if ref[0] not in relinked]
+            if not linked:
+                orphans.append(name)
+        return sorted(orphans)
+
+    async def relink(self, relinks: Dict[int, Dict[str, str]]) -> set:
+        """Apply the planned field updates; returns the IDs of notes that were updated."""
+        async def update(note_id, fields):
+            try:
+                await self.batcher.invoke("updateNoteFields", note={"id": note_id, "fields": fields})
+                return note_id
+            except Exception as e:
+                self.logger.error(f"Failed to relink note {note_id}: {e}")
+                return None
+
+        results = await asyncio.gather(*(update(note_id, fields) for note_id, fields in relinks.items()))
+        relinked = {note_id for note_id in results if note_id is not None}
+        if relinked:
+            self.logger.info(f"Relinked {len(relinked)} notes to canonical clips")
+        return relinked
+
+    async def delete_media(self, names: List[str]) -> int:
+        async def delete(name):
+            try:
+                await self.batcher.invoke("deleteMediaFile", filename=name)
+                return name
+            except Exception as e:
+                self.logger.error(f"Failed to delete {name}: {e}")
+                return None
+
+        deleted = [name for name in await asyncio.gather(*(delete(name) for name in names)) if name]
+        self.index.remove(deleted)
+        self.logger.info(f"Deleted {len(deleted)} unreferenced clips")
+        return len(deleted)
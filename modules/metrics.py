@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import random
+import bisect
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Upper bounds (seconds) of the latency histogram buckets, as in Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageMetrics:
+    """Latency histogram, counters and in-flight gauge for one stage."""
+
+    def __init__(self, name: str, sample_size: int = 10000):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.buckets = [0] * len(BUCKETS)
+        # Reservoir sample of latencies, so percentiles stay exact-ish on any run length
+        self.sample_size = sample_size
+        self.samples: List[float] = []
+
+    def start(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def observe(self, duration: float, ok: bool = True):
+        self.in_flight -= 1
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        index = bisect.bisect_left(BUCKETS, duration)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        if len(self.samples) < self.sample_size:
+            self.samples.append(duration)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.sample_size:
+                self.samples[slot] = duration
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self, elapsed: float) -> Dict[str, object]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "per_sec": round(self.count / elapsed, 2) if elapsed > 0 else None,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(0.5)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max),
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+class Metrics:
+    """Per-stage timings and run counters, exportable as JSON or Prometheus text.
+
+    Wrap a unit of work in `track(stage)` (it works around `await` as well);
+    plain counts such as processed notes go through `increment()`, and
+    current values such as a concurrency limit through `set_gauge()`.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageMetrics] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.started = time.time()
+        self._start = time.monotonic()
+
+    def stage(self, name: str) -> StageMetrics:
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    @contextmanager
+    def track(self, name: str):
+        stage = self.stage(name)
+        stage.start()
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            stage.observe(time.monotonic() - start, ok)
+
+    def increment(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def reset(self):
+        # Gauges describe current state rather than the run, so they are kept
+        self.stages.clear()
+        self.counters.clear()
+        self.started = time.time()
+        self._start = time.monotonic()
+
+    def summary(self) -> Dict[str, object]:
+        elapsed = time.monotonic() - self._start
+        return {
+            "started": self.started,
+            "elapsed_s": round(elapsed, 3),
+            "counters": dict(self.counters),
+            "per_sec": {name: round(value / elapsed, 2) if elapsed > 0 else None
+                        for name, value in self.counters.items()},
+            "gauges": dict(self.gauges),
+            "stages": {name: stage.summary(elapsed) for name, stage in sorted(self.stages.items())},
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+
+    def prometheus(self, prefix: str = "voicevox_anki") -> str:
+        lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+        for name, stage in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stage.buckets):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stage.count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stage.total:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stage.count}')
+        lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+        lines += [f'{prefix}_stage_errors_total{{stage="{name}"}} {stage.errors}'
+                  for name, stage in sorted(self.stages.items())]
+        lines.append(f"# TYPE {prefix}_stage_in_flight gauge")
+        lines += [f'{prefix}_stage_in_flight{{stage="{name}"}} {stage.in_flight}'
+                  for name, stage in sorted(self.stages.items())]
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        lines += [f'{prefix}_events_total{{event="{name}"}} {value}'
+                  for name, value in sorted(self.counters.items())]
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        # Write then rename so a node_exporter textfile collector never reads a partial file
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(temp_path, path)
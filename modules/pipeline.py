@@ -0,0 +1,193 @@
+import asyncio
+from typing import Optional
+from .journal import SYNTHESIZED, STORED
+
+# Sentinel telling a stage worker that its inbox is drained
+_DONE = object()
+
+
+class NotePipeline:
+    """Runs audio queries, synthesis, MP3 encoding and AnkiConnect uploads as overlapping stages.
+
+    Each stage has its own pool of workers and the stages are connected by
+    bounded queues, so a slow stage pushes back on the one before it instead of
+    piling up clips in memory. The encode stage runs one worker per encoder
+    process so every core stays busy while synthesis keeps streaming.
+    """
+
+    def __init__(self, processor, workers: int, queue_size: Optional[int] = None):
+        self.processor = processor
+        self.logger = processor.logger
+        self.workers = max(1, workers)
+        # Batched synthesis needs enough waiting texts to fill `workers` multi_synthesis calls at
+        # once; with only one batch's worth, a single request would be in flight at a time
+        synth_batcher = processor.synth_batcher
+        self.query_workers = self.workers
+        self.synth_workers = self.workers * synth_batcher.batch_size if synth_batcher is not None else self.workers
+        self.encode_workers = processor.encoder.max_workers
+        # Uploads mostly wait on batched AnkiConnect round trips, so give that
+        # stage enough workers to fill a whole `multi` batch
+        batcher = processor.batcher
+        self.upload_workers = max(self.workers, batcher.batch_size) if batcher is not None else self.workers
+        self.queue_size = queue_size or max(self.synth_workers, self.encode_workers) * 2
+        self.pending = {}
+        self.completed = 0
+        self.total = 0
+        self.queues = {}
+
+    async def run(self, notes):
+        """Process an async iterable of (DeckJob, note) pairs, starting work as soon as the first arrives."""
+        self.order = {}
+        query_queue = asyncio.Queue(self.queue_size)
+        synth_queue = asyncio.Queue(self.queue_size)
+        encode_queue = asyncio.Queue(self.queue_size)
+        upload_queue = asyncio.Queue(self.queue_size)
+        self.queues = {"query": query_queue, "synthesize": synth_queue, "encode": encode_queue, "upload": upload_queue}
+
+        tasks = [
+            asyncio.ensure_future(self._produce(notes, query_queue, self.query_workers)),
+            asyncio.ensure_future(self._run_stage(self._query, query_queue, self.query_workers,
+                                                  synth_queue, self.synth_workers)),
+            asyncio.ensure_future(self._run_stage(self._synthesize, synth_queue, self.synth_workers,
+                                                  encode_queue, self.encode_workers)),
+            asyncio.ensure_future(self._run_stage(self._encode, encode_queue, self.encode_workers,
+                                                  upload_queue, self.upload_workers)),
+            asyncio.ensure_future(self._run_stage(self._upload, upload_queue, self.upload_workers)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Concurrent stages finish notes out of order; report them in deck order
+        self.processor.dry_run_updates.sort(key=lambda update: self.order.get(update[0], 0))
+
+    def queue_depths(self) -> dict:
+        """Items waiting in front of each stage, plus notes that still have fields in flight."""
+        depths = {name: queue.qsize() for name, queue in self.queues.items()}
+        depths["pending_notes"] = len(self.pending)
+        return depths
+
+    async def _produce(self, notes, outbox: asyncio.Queue, consumers: int):
+        async for deck_job, note in notes:
+            note_id = note["noteId"]
+            self.order[note_id] = len(self.order)
+            self.total += 1
+            note_jobs = self.processor.note_jobs(note, deck_job)
+            if not note_jobs:
+                self.completed += 1
+                continue
+            self.pending[note_id] = {"remaining": len(note_jobs), "slots": [None] * len(note_jobs)}
+            for slot, (audio_field, prefix, text, style_id) in enumerate(note_jobs):
+                await outbox.put((note_id, slot, audio_field, prefix, text, style_id))
+        for _ in range(consumers):
+            await outbox.put(_DONE)
+
+    async def _run_stage(self, handler, inbox: asyncio.Queue, workers: int,
+                         outbox: Optional[asyncio.Queue] = None, consumers: int = 0):
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                result = await handler(item)
+                if result is not None and outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            for _ in range(consumers):
+                await outbox.put(_DONE)
+
+    async def _query(self, job: tuple):
+        """Resolve the field from earlier work if possible, otherwise fetch its AudioQuery."""
+        note_id, _, audio_field, _, text, style_id = job
+        resumed = await self.processor.resumed_media(note_id, audio_field, text, style_id)
+        if resumed:
+            await self._field_done(job, None, resumed)
+            return None
+
+        key = self.processor.text_key(text, style_id)
+        existing = await self.processor.claim_media(key)
+        if existing:
+            await self._field_done(job, None, existing)
+            return None
+        try:
+            audio = self.processor.cached_audio(text, key)
+            audio_query = None if audio else await self.processor.audio_query(text, style_id)
+        except BaseException:
+            self.processor.release_media(key, None)
+            raise
+        return job, key, audio_query, audio
+
+    async def _synthesize(self, item: tuple):
+        job, key, audio_query, audio = item
+        note_id, _, audio_field, _, text, style_id = job
+        if audio is None:
+            try:
+                audio = await self.processor.synthesize(text, key, audio_query, style_id)
+            except BaseException:
+                self.processor.release_media(key, None)
+                raise
+        if not audio:
+            await self._field_done(job, key, None)
+            return None
+        self.processor.journal_record(note_id, audio_field, text, SYNTHESIZED, style_id=style_id)
+        return job, key, audio
+
+    async def _encode(self, item: tuple):
+        job, key, audio = item
+        if self.processor.dry_run:
+            return job, key, None
+        try:
+            mp3_data = await self.processor.encoder.encode(audio)
+        except Exception as e:
+            # A clip that fails to encode only costs its own field, not the run
+            self.logger.error(f"Failed to encode audio for note {job[0]}: {e}")
+            await self._field_done(job, key, None)
+            return None
+        except BaseException:
+            self.processor.release_media(key, None)
+            raise
+        return job, key, mp3_data
+
+    async def _upload(self, item: tuple):
+        job, key, mp3_data = item
+        note_id, _, _, prefix, _, _ = job
+        filename = self.processor.media_filename(prefix, note_id, key)
+        if self.processor.dry_run:
+            saved_filename = f"{filename}.mp3 (dry-run)"
+        else:
+            try:
+                if self.processor.batcher is not None:
+                    saved_filename = await self.processor.batcher.store_media(mp3_data, filename)
+                else:
+                    saved_filename = await self.processor.anki_async.upload_mp3(mp3_data, filename)
+            except Exception as e:
+                self.logger.error(f"Failed to store audio {filename}: {e}")
+                saved_filename = None
+            except BaseException:
+                self.processor.release_media(key, None)
+                raise
+        await self._field_done(job, key, saved_filename)
+
+    async def _field_done(self, job: tuple, key: Optional[str], filename: Optional[str]):
+        note_id, slot, audio_field, _, text, style_id = job
+        # Wake any duplicate of this clip waiting in claim_media()
+        self.processor.release_media(key, filename)
+        state = self.pending[note_id]
+        if filename:
+            if not self.processor.dry_run:
+                self.processor.journal_record(note_id, audio_field, text, STORED, filename, style_id)
+            state["slots"][slot] = (audio_field, f"[sound:{filename}]")
+        state["remaining"] -= 1
+        if state["remaining"]:
+            return
+
+        del self.pending[note_id]
+        updates = dict(slot for slot in state["slots"] if slot)
+        if updates:
+            await self.processor.apply_updates(note_id, updates)
+        self.completed += 1
+        self.logger.debug("Processed note %d/%d fetched", self.completed, self.total)
@@ -0,0 +1,131 @@
+import struct
+import hashlib
+from typing import Optional, Tuple
+import numpy as np
+
+# Default targets in dBFS: peak leaves headroom for the MP3 encoder, loudness
+# is the RMS level of the speech itself (close to LUFS for VOICEVOX voices)
+DEFAULT_TARGETS = {"peak": -1.0, "loudness": -20.0}
+# Loudness normalization never pushes peaks above this
+PEAK_CEILING_DB = -1.0
+
+
+def parse_wav(data: bytes) -> Tuple[int, int, np.ndarray]:
+    """Return (sample rate, channels, samples) for 16-bit PCM WAV bytes.
+
+    The samples are a read-only view into `data` (np.frombuffer), shaped
+    (frames, channels), so nothing is copied until a clip is changed.
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+    offset = 12
+    rate = channels = bits = None
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if audio_format != 1 or bits != 16:
+                raise ValueError(f"unsupported WAV format {audio_format} with {bits} bits")
+        elif chunk_id == b"data":
+            if rate is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            # Some writers leave the size at 0 or 0xFFFFFFFF when streaming
+            size = min(size, len(data) - body) if size else len(data) - body
+            frames = size // (2 * channels)
+            samples = np.frombuffer(data, dtype="<i2", count=frames * channels, offset=body)
+            return rate, channels, samples.reshape(frames, channels)
+        offset = body + size + (size & 1)
+    raise ValueError("WAV has no data chunk")
+
+
+def write_wav(rate: int, samples: np.ndarray) -> bytes:
+    channels = samples.shape[1]
+    payload = np.ascontiguousarray(samples, dtype="<i2").tobytes()
+    header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(payload), b"WAVE", b"fmt ", 16, 1, channels,
+                         rate, rate * channels * 2, channels * 2, 16, b"data", len(payload))
+    return header + payload
+
+
+def db_to_amplitude(db: float) -> float:
+    return 32768.0 * 10 ** (db / 20)
+
+
+class AudioPostProcessor:
+    """Trims silence from and normalizes synthesized clips before encoding.
+
+    Everything works on whole NumPy arrays: silence is found from per-frame
+    energy (10 ms frames), and normalization is a single gain. Instances are
+    plain data, so the encoder pool can run process() in its worker processes.
+    """
+
+    def __init__(self, trim_silence: bool = False, silence_threshold_db: float = -50.0, pad_ms: float = 50.0,
+                 normalize: Optional[str] = None, target_db: Optional[float] = None):
+        if normalize is not None and normalize not in DEFAULT_TARGETS:
+            raise ValueError(f"normalize must be one of {', '.join(DEFAULT_TARGETS)}")
+        self.trim_silence = trim_silence
+        self.silence_threshold_db = silence_threshold_db
+        self.pad_ms = pad_ms
+        self.normalize = normalize
+        self.target_db = DEFAULT_TARGETS[normalize] if normalize and target_db is None else target_db
+
+    @property
+    def enabled(self) -> bool:
+        return self.trim_silence or self.normalize is not None
+
+    def signature(self) -> str:
+        """Short hash of the settings, so media made with other settings is not reused."""
+        settings = f"{self.trim_silence}:{self.silence_threshold_db}:{self.pad_ms}:{self.normalize}:{self.target_db}"
+        return hashlib.sha1(settings.encode("ascii")).hexdigest()[:8]
+
+    def process(self, wav_data: bytes) -> bytes:
+        """Return the processed WAV, or the input unchanged if it is not 16-bit PCM or needs no change."""
+        try:
+            rate, _, samples = parse_wav(wav_data)
+        except (ValueError, struct.error):
+            return wav_data
+        processed = samples
+        if self.trim_silence:
+            processed = self.trim(processed, rate)
+        if self.normalize is not None:
+            processed = self.apply_gain(processed)
+        if processed is samples:
+            return wav_data
+        return write_wav(rate, processed)
+
+    def trim(self, samples: np.ndarray, rate: int) -> np.ndarray:
+        """Cut leading and trailing frames quieter than the threshold; returns a view."""
+        frame = max(1, rate // 100)
+        frames = len(samples) // frame
+        if frames == 0:
+            return samples
+        blocks = samples[:frames * frame].reshape(frames, -1).astype(np.float32)
+        energy = np.mean(blocks * blocks, axis=1)
+        loud = np.flatnonzero(energy >= db_to_amplitude(self.silence_threshold_db) ** 2)
+        if loud.size == 0:
+            # Silent clip: keep it rather than uploading nothing
+            return samples
+        pad = int(rate * self.pad_ms / 1000)
+        start = max(0, loud[0] * frame - pad)
+        end = min(len(samples), (loud[-1] + 1) * frame + pad)
+        if start == 0 and end == len(samples):
+            return samples
+        return samples[start:end]
+
+    def apply_gain(self, samples: np.ndarray) -> np.ndarray:
+        if samples.size == 0:
+            return samples
+        floats = samples.astype(np.float32)
+        peak = float(np.max(np.abs(floats)))
+        if peak == 0:
+            return samples
+        if self.normalize == "peak":
+            gain = db_to_amplitude(self.target_db) / peak
+        else:
+            rms = float(np.sqrt(np.mean(floats * floats)))
+            gain = min(db_to_amplitude(self.target_db) / rms, db_to_amplitude(PEAK_CEILING_DB) / peak)
+        if abs(gain - 1.0) < 1e-3:
+            return samples
+        np.multiply(floats, gain, out=floats)
+        np.clip(floats, -32768, 32767, out=floats)
+        return np.rint(floats).astype("<i2")
@@ -0,0 +1,62 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional
+
+
+class QueryCache:
+    """SQLite store of VOICEVOX AudioQuery JSON, keyed by text and style.
+
+    The accent phrases and moras in an AudioQuery depend only on the text and
+    the style, so queries are stored before any prosody overrides (speed,
+    pitch, ...) are applied. A run that only changes those overrides reuses
+    the stored queries and goes straight to synthesis.
+    """
+
+    def __init__(self, path: str, logger):
+        self.path = path
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # last_access is set when a query is stored; nothing evicts by it, so hits do not write
+        self._db.execute("CREATE TABLE IF NOT EXISTS queries (key TEXT PRIMARY KEY, query TEXT, last_access REAL)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(text: str, style_id: Optional[int]) -> str:
+        payload = json.dumps({"text": text, "style_id": style_id}, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT query FROM queries WHERE key = ?", (key,)).fetchone()
+            if not row:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, query: dict):
+        payload = json.dumps(query, ensure_ascii=False)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO queries (key, query, last_access) VALUES (?, ?, ?)",
+                             (key, payload, time.time()))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,85 +1,379 @@
+import io
+import os
+import json
+import time
 import aiohttp
 import asyncio
-from voicevox import Client
-from typing import Optional, List, Tuple
+import zipfile
+from typing import Optional, List, Tuple, Dict
+from .engine_pool import EnginePool
+from .concurrency import AdaptiveLimiter, backoff_delay
+from .query_cache import QueryCache
+from .metrics import Metrics
+
+
+class VoiceVoxError(RuntimeError):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        # 4xx means the request itself is bad (e.g. unreadable text); retrying will not help
+        return self.status is None or self.status >= 500
 
 class VoiceVoxClient:
-    def __init__(self, url: str = "http://127.0.0.1:50021", logger=None, style_id: Optional[int] = None):
-        self.url = url
+    def __init__(self, url: str = "http://127.0.0.1:50021", logger=None, style_id: Optional[int] = None,
+                 pool_size: int = 8, keepalive_timeout: float = 30.0, query_params: Optional[dict] = None,
+                 urls: Optional[List[str]] = None, health_check_interval: float = 10.0,
+                 adaptive: bool = True, max_retries: int = 3, query_cache: Optional[QueryCache] = None,
+                 metrics: Optional[Metrics] = None, speaker_cache: Optional[str] = None,
+                 speaker_cache_ttl: float = 86400.0):
+        # Several engine URLs are load balanced; `url` is used when only one is given
+        self.engines = EnginePool(urls or [url], logger)
+        self.url = self.engines.endpoints[0].url
         self.style_id = style_id
         self.speaker_name = "四国めたん"
         self.style_name = "あまあま"
         self.logger = logger
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        # AudioQuery overrides such as speedScale or pitchScale applied before synthesis
+        self.query_params = query_params or {}
+        self.query_cache = query_cache
+        self.metrics = metrics or Metrics()
+        self.health_check_interval = health_check_interval
+        # Local copy of /speakers, so short runs skip speaker discovery
+        self.speaker_cache = speaker_cache
+        self.speaker_cache_ttl = speaker_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self.max_retries = max_retries
+        # Adapts how many synthesis requests are in flight to the engines' latency and errors
+        max_in_flight = pool_size * len(self.engines.endpoints)
+        self.limiter = AdaptiveLimiter(logger, initial=max(1, max_in_flight // 2), max_limit=max_in_flight,
+                                       metrics=self.metrics) if adaptive else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared pooled session, opening it on first use."""
+        if self._session is None or self._session.closed:
+            endpoints = len(self.engines.endpoints)
+            connector = aiohttp.TCPConnector(limit=self.pool_size * endpoints, limit_per_host=self.pool_size,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self.logger.debug(f"Opened VOICEVOX session (pool size {self.pool_size} x {endpoints} engines)")
+            if endpoints > 1 and self.health_check_interval:
+                self._health_task = asyncio.ensure_future(self._health_checks())
+        return self._session
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            self.logger.debug("Closed VOICEVOX session")
+        self._session = None
+
+    async def _probe(self, endpoint) -> bool:
+        try:
+            timeout = aiohttp.ClientTimeout(total=5)
+            async with self._get_session().get(f"{endpoint.url}/version", timeout=timeout) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    async def _health_checks(self):
+        """Periodically probe every engine, returning recovered ones to rotation."""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for endpoint in self.engines.endpoints:
+                self.engines.mark(endpoint, healthy=await self._probe(endpoint))
+
+    async def _request(self, method: str, path: str, **kwargs):
+        session = self._get_session()
+        # Only synthesis work (POSTs) counts against the adaptive in-flight limit
+        limiter = self.limiter if method == "POST" else None
+        if limiter is not None:
+            await limiter.acquire()
+        endpoint = self.engines.acquire()
+        start = time.monotonic()
+        ok = False
+        try:
+            with self.metrics.track(f"voicevox{path.replace('/', '.')}"):
+                async with session.request(method, f"{endpoint.url}{path}", **kwargs) as response:
+                    if response.status >= 400:
+                        detail = await response.text()
+                        # A 4xx is about this request (e.g. bad text), not the engine's health
+                        ok = response.status < 500
+                        raise VoiceVoxError(f"VOICEVOX {endpoint.url}{path} returned {response.status}: {detail}",
+                                            response.status)
+                    if response.content_type == "application/json":
+                        result = await response.json()
+                    else:
+                        result = await response.read()
+                    ok = True
+                    return result
+        except asyncio.CancelledError:
+            # A cancelled run is not the engine's fault
+            ok = None
+            raise
+        finally:
+            latency = time.monotonic() - start
+            self.engines.release(endpoint, latency, ok)
+            if limiter is not None:
+                if ok is None:
+                    limiter.abandon()
+                else:
+                    limiter.release(latency, ok, path)
+
+    async def fetch_speakers(self, refresh: bool = False) -> List[dict]:
+        """Return the engine's speakers, from the local cache while it is younger than speaker_cache_ttl."""
+        if not refresh:
+            speakers = self._load_speakers()
+            if speakers is not None:
+                return speakers
+        speakers = await self._request("GET", "/speakers")
+        self._save_speakers(speakers)
+        return speakers
+
+    def _speaker_cache_enabled(self) -> bool:
+        return bool(self.speaker_cache) and self.speaker_cache_ttl > 0
+
+    def _load_speakers(self) -> Optional[List[dict]]:
+        if not self._speaker_cache_enabled():
+            return None
+        try:
+            with open(self.speaker_cache, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        urls = [endpoint.url for endpoint in self.engines.endpoints]
+        if data.get("urls") != urls or time.time() - data.get("fetched", 0) > self.speaker_cache_ttl:
+            return None
+        self.logger.debug(f"Loaded VOICEVOX speakers from {self.speaker_cache}")
+        return data.get("speakers")
+
+    def _save_speakers(self, speakers: List[dict]):
+        # Only written next to an existing cache, so listing speakers creates no directories
+        if not self._speaker_cache_enabled() or not os.path.isdir(os.path.dirname(self.speaker_cache) or "."):
+            return
+        data = {"urls": [endpoint.url for endpoint in self.engines.endpoints], "fetched": time.time(),
+                "speakers": speakers}
+        temp_path = f"{self.speaker_cache}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.speaker_cache)
+        except OSError as e:
+            self.logger.warning(f"Could not save speaker cache {self.speaker_cache}: {e}")
+
+    def _resolve_style(self, speakers: List[dict]) -> bool:
+        if self.style_id is not None:
+            # Check if provided style_id exists
+            for speaker in speakers:
+                for style in speaker["styles"]:
+                    if style["id"] == self.style_id:
+                        self.speaker_name = speaker["name"]
+                        self.style_name = style["name"]
+                        self.logger.info(f"Using style_id {self.style_id}: {self.speaker_name} ({self.style_name})")
+                        return True
+        else:
+            # Find style by name
+            for speaker in speakers:
+                if speaker["name"] == self.speaker_name:
+                    for style in speaker["styles"]:
+                        if style["name"] == self.style_name:
+                            self.style_id = style["id"]
+                            self.logger.info(f"Found {self.speaker_name} ({self.style_name}) with style_id {self.style_id}")
+                            return True
+        return False
 
     async def initialize(self):
-        async with Client(self.url) as client:
+        try:
+            found = self._resolve_style(await self.fetch_speakers())
+            if not found and self._speaker_cache_enabled():
+                # The cached list may predate a newly installed voice
+                found = self._resolve_style(await self.fetch_speakers(refresh=True))
+
+            if not found:
+                raise ValueError(f"Style '{self.style_name}' (ID {self.style_id}) for {self.speaker_name} not found.")
+        except Exception as e:
+            self.logger.error(f"VOICEVOX initialization failed: {e}")
+            raise
+
+    async def create_audio_query(self, text: str, style_id: Optional[int] = None) -> dict:
+        """Return the AudioQuery for text with query_params applied, reusing a stored one if possible."""
+        style_id = self.style_id if style_id is None else style_id
+        key = QueryCache.make_key(text, style_id) if self.query_cache is not None else None
+        audio_query = self.query_cache.get(key) if key is not None else None
+        if audio_query is None:
+            audio_query = await self._request("POST", "/audio_query", params={"text": text, "speaker": style_id})
+            if key is not None:
+                # Stored without overrides so prosody changes can reuse it
+                self.query_cache.put(key, audio_query)
+        audio_query.update(self.query_params)
+        return audio_query
+
+    async def synthesis(self, audio_query: dict, style_id: Optional[int] = None) -> bytes:
+        speaker = self.style_id if style_id is None else style_id
+        return await self._request("POST", "/synthesis", params={"speaker": speaker}, json=audio_query)
+
+    async def multi_synthesis(self, audio_queries: List[dict], style_id: Optional[int] = None) -> List[bytes]:
+        """Synthesize several queries in one request; the engine answers with a zip of WAVs."""
+        speaker = self.style_id if style_id is None else style_id
+        data = await self._request("POST", "/multi_synthesis", params={"speaker": speaker}, json=audio_queries)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            # Entries are numbered in request order (001.wav, 002.wav, ...)
+            names = sorted(archive.namelist(), key=lambda name: int("".join(c for c in name if c.isdigit()) or 0))
+            clips = [archive.read(name) for name in names]
+        if len(clips) != len(audio_queries):
+            raise VoiceVoxError(f"multi_synthesis returned {len(clips)} clips for {len(audio_queries)} queries")
+        return clips
+
+    async def generate_audio_batch(self, texts: List[str], audio_queries: Optional[List[Optional[dict]]] = None,
+                                   style_id: Optional[int] = None) -> List[Optional[bytes]]:
+        """Synthesize many texts with one /multi_synthesis call.
+
+        Queries not passed in are created per text (concurrently). If the batch
+        call fails, each text falls back to generate_audio() with its retries.
+        """
+        audio_queries = list(audio_queries or [None] * len(texts))
+        try:
+            missing = [i for i, query in enumerate(audio_queries) if query is None]
+            created = await asyncio.gather(*(self.create_audio_query(texts[i], style_id) for i in missing))
+            for i, query in zip(missing, created):
+                audio_queries[i] = query
+            clips = await self.multi_synthesis(audio_queries, style_id)
+            self.logger.debug("Generated audio for %d texts in one multi_synthesis call", len(texts))
+            return [clip if clip else None for clip in clips]
+        except Exception as e:
+            self.logger.warning(f"Batch synthesis of {len(texts)} texts failed, falling back to single requests: {e}")
+            return list(await asyncio.gather(*(self.generate_audio(text, query, style_id)
+                                               for text, query in zip(texts, audio_queries))))
+
+    async def generate_audio(self, text: str, audio_query: Optional[dict] = None,
+                             style_id: Optional[int] = None) -> Optional[bytes]:
+        """Synthesize text, creating its AudioQuery first unless one is passed in.
+
+        The query is kept across retries, so a failed synthesis call does not
+        repeat the query step.
+        """
+        for attempt in range(self.max_retries):
             try:
-                speakers = await client.fetch_speakers()
-                speaker_info = [(s.name, [(st.name, st.id) for st in s.styles]) for s in speakers]
-
-                found = False
-                if self.style_id is not None:
-                    # Check if provided style_id exists
-                    for speaker in speakers:
-                        for style in speaker.styles:
-                            if style.id == self.style_id:
-                                self.speaker_name = speaker.name
-                                self.style_name = style.name
-                                self.logger.info(f"Using style_id {self.style_id}: {self.speaker_name} ({self.style_name})")
-                                found = True
-                                break
-                        if found:
-                            break
-                else:
-                    # Find style by name
-                    for speaker in speakers:
-                        if speaker.name == self.speaker_name:
-                            for style in speaker.styles:
-                                if style.name == self.style_name:
-                                    self.style_id = style.id
-                                    self.logger.info(f"Found {self.speaker_name} ({self.style_name}) with style_id {self.style_id}")
-                                    found = True
-                                    break
-                        if found:
-                            break
-
-                if not found:
-                    raise ValueError(f"Style '{self.style_name}' (ID {self.style_id}) for {self.speaker_name} not found.")
+                if audio_query is None:
+                    audio_query = await self.create_audio_query(text, style_id)
+                audio = await self.synthesis(audio_query, style_id)
+                if len(audio) > 0:
+                    self.logger.debug("Generated audio for text: %.50s...", text)
+                    return audio
+                self.logger.warning(f"Empty audio for text: {text}")
+            except VoiceVoxError as e:
+                self.logger.error(f"Attempt {attempt + 1} failed for text '{text}': {e}")
+                if not e.retryable:
+                    break
             except Exception as e:
-                self.logger.error(f"VOICEVOX initialization failed: {e}")
-                raise
-
-    async def generate_audio(self, text: str) -> Optional[bytes]:
-        for attempt in range(3):
-            async with Client(self.url) as client:
-                try:
-                    audio_query = await client.create_audio_query(text, speaker=self.style_id)
-                    audio = await audio_query.synthesis(speaker=self.style_id)
-                    if len(audio) > 0:
-                        self.logger.debug(f"Generated audio for text: {text[:50]}...")
-                        return audio
-                    self.logger.warning(f"Empty audio for text: {text}")
-                except Exception as e:
-                    self.logger.error(f"Attempt {attempt + 1} failed for text '{text}': {e}")
-                    await asyncio.sleep(1)
+                self.logger.error(f"Attempt {attempt + 1} failed for text '{text}': {e}")
+            if attempt + 1 < self.max_retries:
+                await asyncio.sleep(backoff_delay(attempt))
         self.logger.error(f"Failed to generate audio for text: {text}")
         return None
 
     async def check_connection(self) -> bool:
-        async with aiohttp.ClientSession() as session:
+        """Check every engine; succeeds if at least one is reachable."""
+        reachable = False
+        for endpoint in self.engines.endpoints:
             try:
-                async with session.get(self.url) as response:
-                    self.logger.debug(f"VOICEVOX connection check: status {response.status}")
-                    return response.status == 200
+                async with self._get_session().get(endpoint.url) as response:
+                    self.logger.debug(f"VOICEVOX connection check {endpoint.url}: status {response.status}")
+                    healthy = response.status == 200
             except Exception as e:
-                self.logger.error(f"VOICEVOX connection check failed: {e}")
-                return False
+                self.logger.error(f"VOICEVOX connection check failed for {endpoint.url}: {e}")
+                healthy = False
+            self.engines.mark(endpoint, healthy)
+            reachable = reachable or healthy
+        return reachable
 
     async def list_speakers(self) -> List[Tuple[str, List[Tuple[str, int]]]]:
-        async with Client(self.url) as client:
-            try:
-                speakers = await client.fetch_speakers()
-                return [(s.name, [(st.name, st.id) for st in s.styles]) for s in speakers]
-            except Exception as e:
-                self.logger.error(f"Failed to list speakers: {e}")
-                return []
\ No newline at end of file
+        try:
+            speakers = await self.fetch_speakers()
+            return [(s["name"], [(st["name"], st["id"]) for st in s["styles"]]) for s in speakers]
+        except Exception as e:
+            self.logger.error(f"Failed to list speakers: {e}")
+            return []
+
+    async def style_names(self, refresh: bool = False) -> Dict[int, str]:
+        """Map every style ID the engine offers to "speaker (style)"."""
+        speakers = await self.fetch_speakers(refresh)
+        return {style["id"]: f"{speaker['name']} ({style['name']})"
+                for speaker in speakers for style in speaker["styles"]}
+
+
+class SynthesisBatcher:
+    """Groups single-text synthesis requests into multi_synthesis batches.
+
+    A batch is sent once `batch_size` texts are waiting or the oldest one has
+    waited `max_delay` seconds, which bounds the latency batching adds.
+    """
+
+    def __init__(self, client: VoiceVoxClient, logger, batch_size: int = 8, max_delay: float = 0.05):
+        self.client = client
+        self.logger = logger
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending = set()
+
+    async def generate_audio(self, text: str, audio_query: Optional[dict] = None,
+                             style_id: Optional[int] = None) -> Optional[bytes]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, audio_query, style_id, future))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list):
+        # One multi_synthesis call speaks with a single voice, so split mixed batches by style
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[2], []).append(item)
+        await asyncio.gather(*(self._send_group(style_id, group) for style_id, group in groups.items()))
+
+    async def _send_group(self, style_id: Optional[int], batch: list):
+        try:
+            clips = await self.client.generate_audio_batch([text for text, _, _, _ in batch],
+                                                           [query for _, query, _, _ in batch], style_id)
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, _, future), clip in zip(batch, clips):
+            if not future.done():
+                future.set_result(clip)
+
+    async def close(self):
+        self.flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
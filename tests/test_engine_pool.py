@@ -0,0 +1,72 @@
+import socket
+import asyncio
+import logging
+from aiohttp import web
+from benchmarks.stub_servers import StubConfig, StubVoiceVox
+from modules.voicevox_client import VoiceVoxClient
+
+HOST = "127.0.0.1"
+
+
+async def start_stub(stub: StubVoiceVox, port: int = 0):
+    runner = web.AppRunner(stub.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, port)
+    await site.start()
+    return runner, f"http://{HOST}:{site._server.sockets[0].getsockname()[1]}"
+
+
+def free_port() -> int:
+    # Nothing listens on the port once the socket is closed, so connections are refused
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def test_engine_pool_balances_and_recovers():
+    async def scenario():
+        stubs = [StubVoiceVox(StubConfig(latency_ms=20, seed=seed)) for seed in range(3)]
+        runners = []
+        urls = []
+        for stub in stubs:
+            runner, url = await start_stub(stub)
+            runners.append(runner)
+            urls.append(url)
+        dead_port = free_port()
+        dead_url = f"http://{HOST}:{dead_port}"
+        client = VoiceVoxClient(logger=logging.getLogger("test"), style_id=0, urls=urls + [dead_url],
+                                health_check_interval=0.2, adaptive=False)
+        try:
+            # Requests already spread to the dead engine fail fast, and it leaves the rotation
+            await asyncio.gather(*(client.create_audio_query(f"first {i}") for i in range(30)),
+                                 return_exceptions=True)
+            dead = client.engines.endpoints[-1]
+            assert not dead.healthy
+            assert dead.failures >= client.engines.max_failures
+
+            before = [stub.counts.get("audio_query", 0) for stub in stubs]
+            failures = dead.failures
+            await asyncio.gather(*(client.create_audio_query(f"text {i}") for i in range(90)))
+            served = [stub.counts.get("audio_query", 0) - count for stub, count in zip(stubs, before)]
+            # Once out of rotation it gets no traffic, and the live engines share it roughly evenly
+            assert dead.failures == failures
+            assert sum(served) == 90
+            assert min(served) >= 0.7 * max(served)
+
+            # Bring the engine up on the same port; the next health check returns it to rotation
+            revived = StubVoiceVox(StubConfig(latency_ms=20, seed=3))
+            runner, _ = await start_stub(revived, dead_port)
+            runners.append(runner)
+            for _ in range(50):
+                if dead.healthy:
+                    break
+                await asyncio.sleep(0.05)
+            assert dead.healthy
+            await asyncio.gather(*(client.create_audio_query(f"more {i}") for i in range(40)))
+            assert revived.counts.get("audio_query", 0) > 0
+        finally:
+            await client.close()
+            for runner in runners:
+                await runner.cleanup()
+
+    asyncio.run(scenario())